@@ -20,6 +20,15 @@ then
     exit 1
 fi
 
+# the data is downloaded with the download_jobs command of the
+# trifinger_example package, which has to be installed on this machine
+if ! command -v download_jobs > /dev/null
+then
+    echo "download_jobs not found.  Install the trifinger_example package"
+    echo "(see Installation in README.md) to download the data."
+    exit 1
+fi
+
 # prompt for username and password (to avoid having user credentials in the
 # bash history)
 read -p "Username: " username
@@ -50,18 +59,14 @@ function curl_check_if_exists()
 echo "Check ${job_id}"
 if curl_check_if_exists ${job_id}
 then
-    # create directory for this job
-    job_dir="${output_directory}/${job_id}"
-    mkdir "${job_dir}"
-
-    echo "Download data to ${job_dir}"
-
-    # Download data.  Here only the report file is downloaded as example.  Add
-    # equivalent commands for other files as needed.
-    for file in report.json info.json goal.json robot_data.dat camera_data.dat camera60.yml camera180.yml camera300.yml
-    do
-        curl --user ${username}:${password} -o "${job_dir}/${file}" ${base_url}/${job_id}/${file}
-    done
+    echo "Download data to ${output_directory}/${job_id}"
+
+    # Download data (in parallel, resumed if interrupted).  Use --files to
+    # select the files.
+    ROBOT_CLUSTER_PASSWORD="${password}" download_jobs \
+        --username "${username}" --output_dir "${output_directory}" \
+        --files report.json info.json goal.json robot_data.dat camera_data.dat camera60.yml camera180.yml camera300.yml \
+        ${job_id}
 else
     echo "No data for ${job_id} found."
     exit 1
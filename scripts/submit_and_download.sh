@@ -34,6 +34,15 @@ then
     exit 1
 fi
 
+# the data is downloaded with the download_jobs command of the
+# trifinger_example package, which has to be installed on this machine
+if ! command -v download_jobs > /dev/null
+then
+    echo "download_jobs not found.  Install the trifinger_example package"
+    echo "(see Installation in README.md) to download the data."
+    exit 1
+fi
+
 # prompt for username and password (to avoid having user credentials in the
 # bash history)
 read -p "Username: " username
@@ -121,10 +130,7 @@ do
         date
     done
 
-    # create directory for this job
     job_dir="${output_directory}/${job_id}"
-    mkdir "${job_dir}"
-    mkdir "${job_dir}/user"
 
     if (( ${job_finished} == 0 ))
     then
@@ -136,12 +142,13 @@ do
 
     echo "Download data to ${job_dir}"
 
-    # Download data. 
-    for file in report.json info.json goal.json robot_data.dat camera_data.dat camera60.yml camera180.yml camera300.yml user_stderr.txt user_stdout.txt
-    do
-        curl --user ${username}:${password} -o "${job_dir}/${file}" ${base_url}/${job_id}/${file}
-    done
-    curl --user ${username}:${password} -o "${job_dir}/user/goals.json" ${base_url}/${job_id}/user/goals.json
+    # Download data (in parallel, resumed if interrupted).
+    if ! ROBOT_CLUSTER_PASSWORD="${password}" download_jobs \
+        --username "${username}" --output_dir "${output_directory}" ${job_id}
+    then
+        echo "Download of job ${job_id} failed."
+        exit 1
+    fi
 
     # if there was a problem with the backend, download its output and exit
     if grep -q "true" "${job_dir}/report.json"
@@ -155,7 +162,7 @@ do
 
     # make video (can add additional data processing here)
     SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
-    apptainer run "$3" python3 ${SCRIPT_DIR}/trifinger_platform_log_viewer_V2.py ${job_dir}/robot_data.dat ${job_dir}/camera_data.dat -g ${job_dir}/user/goals.json --camera camera60 --save-video ${job_dir}/video.avi
+    apptainer run "$3" python3 ${SCRIPT_DIR}/trifinger_platform_log_viewer_V2.py ${job_dir}/robot_data.dat ${job_dir}/camera_data.dat -g ${job_dir}/user/goals.json --camera camera60 --save-video ${job_dir}/video.avi --workers $(nproc)
 
     sleep 60
 
@@ -6,15 +6,18 @@ trifinger_object_tracking package that also reads the robot log to get the time
 step information needed to visualise the changing goal position.
 """
 import argparse
+import collections
+import concurrent.futures
 import json
 import pathlib
+import queue
 import sys
+import threading
 
 import cv2
 import numpy as np
 
 import matplotlib.pyplot as plt
-from matplotlib.lines import Line2D
 
 import robot_fingers
 import trifinger_object_tracking.py_object_tracker
@@ -54,6 +57,335 @@ def blend_images(images1, images2, alpha=0.7):
     return res
 
 
+def make_goal_pose(goal):
+    """Get the ObjectPose of a goal entry of goals.json."""
+
+    goal_pose = trifinger_object_tracking.py_object_tracker.ObjectPose()
+    if "position" in goal:
+        goal_pose.position = goal["position"]
+        goal_pose.orientation = goal.get("orientation", (0, 0, 0, 1))
+    else:
+        position, orientation = get_pose_from_keypoints(goal["keypoints"])
+        goal_pose.position = position
+        goal_pose.orientation = orientation
+    return goal_pose
+
+
+class EpisodeIndex:
+    """Index of the episode windows (t_start, t_end) of the goals.
+
+    A time index t belongs to an episode if t_start < t < t_end.  Time
+    indices between the episodes are reset footage.
+    """
+
+    def __init__(self, goals):
+        goals = sorted(goals, key=lambda goal: goal["t_start"])
+        self.starts = np.array([goal["t_start"] for goal in goals], dtype=int)
+        self.ends = np.array([goal["t_end"] for goal in goals], dtype=int)
+        self.goal_poses = [make_goal_pose(goal) for goal in goals]
+
+    def _windows(self, time_indices):
+        """Get index of the episode of each time index (-1 for none)."""
+
+        if len(self.starts) == 0:
+            return np.full(len(time_indices), -1)
+        windows = np.searchsorted(self.starts, time_indices, side="left") - 1
+        outside = (windows < 0) | (
+            time_indices >= self.ends[np.maximum(windows, 0)]
+        )
+        windows[outside] = -1
+        return windows
+
+    def select(self, time_indices):
+        """Get the time indices that belong to an episode."""
+
+        time_indices = np.asarray(time_indices)
+        return time_indices[self._windows(time_indices) >= 0]
+
+    def goal_pose(self, t):
+        """Get the goal pose of the episode of time index t or None."""
+
+        window = self._windows(np.array([t]))[0]
+        return self.goal_poses[window] if window >= 0 else None
+
+
+# Everything the render stage needs to know about one frame.
+Frame = collections.namedtuple(
+    "Frame", ["t", "observation", "object_pose", "goal_pose"]
+)
+
+
+def read_frames(log, time_indices, unfiltered, episode_index):
+    """Read observations and determine the goal for each time index."""
+
+    for t in time_indices:
+        t = int(t)
+        observation = log.get_camera_observation(t)
+        if unfiltered:
+            object_pose = observation.object_pose
+        else:
+            object_pose = observation.filtered_object_pose
+
+        if episode_index is not None:
+            goal_pose = episode_index.goal_pose(t)
+        else:
+            goal_pose = None
+
+        yield Frame(t, observation, object_pose, goal_pose)
+
+
+class FrameRenderer:
+    """Debayers the camera images of a frame and draws the overlays.
+
+    Only the cameras given by camera_indices are converted, the returned
+    images are in the same order.  Can be called from several threads at
+    once, each thread gets its own CubeVisualizer.
+    """
+
+    def __init__(self, args, make_cube_visualizer, camera_indices):
+        self.args = args
+        self.make_cube_visualizer = make_cube_visualizer
+        self.camera_indices = camera_indices
+        self._local = threading.local()
+
+    def _get_cube_visualizer(self):
+        if not hasattr(self._local, "cube_visualizer"):
+            self._local.cube_visualizer = self.make_cube_visualizer()
+        return self._local.cube_visualizer
+
+    def _draw_overlays(self, frame, images):
+        args = self.args
+        # the CubeVisualizer expects images of all cameras, the ones that
+        # are not shown are not converted but replaced by blank images
+        all_images = [None] * len(CAMERA_NAMES)
+        for i, image in zip(self.camera_indices, images):
+            all_images[i] = image
+        for i, camera in enumerate(frame.observation.cameras):
+            if all_images[i] is None:
+                all_images[i] = np.zeros(
+                    camera.image.shape[:2] + (3,), dtype=np.uint8
+                )
+
+        cube_visualizer = self._get_cube_visualizer()
+        if frame.goal_pose is not None:
+            if args.goal_as_circle:
+                all_images = cube_visualizer.draw_circle(
+                    all_images, frame.goal_pose, True, opacity=0.6, scale=0.64
+                )
+            else:
+                all_images = cube_visualizer.draw_cube(
+                    all_images, frame.goal_pose, True, opacity=0.7
+                )
+
+        if args.visualize_object_pose:
+            all_images = cube_visualizer.draw_cube(
+                all_images, frame.object_pose, False
+            )
+
+        return [all_images[i] for i in self.camera_indices]
+
+    def __call__(self, frame):
+        args = self.args
+        cameras = frame.observation.cameras
+        images = [
+            utils.convert_image(cameras[i].image) for i in self.camera_indices
+        ]
+
+        if frame.goal_pose is not None or args.visualize_object_pose:
+            images = self._draw_overlays(frame, images)
+
+        if args.show_confidence:
+            images = [
+                cv2.putText(
+                    image,
+                    "confidence: %.2f" % frame.object_pose.confidence,
+                    (0, image.shape[0] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5,
+                    (255, 255, 0),
+                )
+                for image in images
+            ]
+
+        return images
+
+
+def render_frames(frames, render, workers):
+    """Render frames and yield (frame, images) in the original order.
+
+    With workers == 0 everything runs sequentially.  Otherwise a reader
+    thread pulls frames from the (possibly slow) frames iterator, a pool of
+    worker threads renders them (OpenCV releases the GIL while debayering)
+    and the results are yielded in order to the caller, which acts as the
+    writer stage.  At most 2 * workers frames are in flight at any time.
+    If the frames iterator raises, the exception is re-raised to the caller
+    after the frames read before it.
+    """
+
+    if workers == 0:
+        for frame in frames:
+            yield frame, render(frame)
+        return
+
+    max_in_flight = 2 * workers
+    frame_queue = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+    end_of_frames = object()
+    # exception raised by the frames iterator, re-raised by the consumer
+    reader_error = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for frame in frames:
+                if not put(frame):
+                    return
+        except Exception as e:
+            # e.g. a corrupt log, deliver the frames read so far first
+            reader_error.append(e)
+        put(end_of_frames)
+
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        try:
+            while True:
+                frame = frame_queue.get()
+                if frame is end_of_frames:
+                    break
+                pending.append((frame, pool.submit(render, frame)))
+                if len(pending) >= max_in_flight:
+                    frame, future = pending.popleft()
+                    yield frame, future.result()
+            while pending:
+                frame, future = pending.popleft()
+                yield frame, future.result()
+            if reader_error:
+                raise reader_error[0]
+        finally:
+            # stop the reader if the caller stopped early
+            stop.set()
+            for _, future in pending:
+                future.cancel()
+
+
+class CubePositionPlot:
+    """Plot of the cube position over time.
+
+    Positions are stored in preallocated arrays.  In live mode, the x/y/z
+    line artists are drawn incrementally with blitting: each new frame only
+    draws the newest line segment on top of the saved background, so the
+    cost per frame does not grow with the length of the log.  The whole plot
+    is only redrawn when the axis limits have to be extended.
+    """
+
+    COLORS = ("red", "green", "blue")
+    LABELS = ("x", "y", "z")
+
+    def __init__(self, max_frames, live):
+        self.timestamps = np.empty(max_frames)
+        self.positions = np.empty((max_frames, 3))
+        self.num_frames = 0
+        self.live = live
+
+        if live:
+            self.fig, self.ax = plt.subplots()
+            self.ax.set_title("Cube Position")
+            self.lines = [
+                self.ax.plot(
+                    [], [], ".-", color=color, label=label, animated=True
+                )[0]
+                for color, label in zip(self.COLORS, self.LABELS)
+            ]
+            self.ax.legend(loc="upper right")
+            self.ax.set_ylim(-0.3, 0.3)
+            self._background = None
+            plt.show(block=False)
+
+    def add(self, timestamp, position):
+        """Add the cube position of one frame."""
+
+        self.timestamps[self.num_frames] = timestamp
+        self.positions[self.num_frames] = position
+        self.num_frames += 1
+        if self.live:
+            self._update()
+
+    def _data_in_view(self, timestamp, position):
+        xmin, xmax = self.ax.get_xlim()
+        ymin, ymax = self.ax.get_ylim()
+        return (
+            xmin <= timestamp <= xmax
+            and ymin <= np.min(position)
+            and np.max(position) <= ymax
+        )
+
+    def _redraw(self):
+        """Extend axis limits and redraw everything."""
+
+        timestamps = self.timestamps[:self.num_frames]
+        positions = self.positions[:self.num_frames]
+
+        # double the time span, so redraws get exponentially rarer
+        span = max(timestamps[-1] - timestamps[0], 1.)
+        self.ax.set_xlim(timestamps[0], timestamps[0] + 2 * span)
+        ymin, ymax = self.ax.get_ylim()
+        margin = 0.1 * (ymax - ymin)
+        self.ax.set_ylim(
+            min(ymin, np.min(positions) - margin),
+            max(ymax, np.max(positions) + margin),
+        )
+
+        self.fig.canvas.draw()
+        for i, line in enumerate(self.lines):
+            line.set_data(timestamps, positions[:, i])
+            self.ax.draw_artist(line)
+
+    def _update(self):
+        n = self.num_frames
+        if self._background is None or not self._data_in_view(
+            self.timestamps[n - 1], self.positions[n - 1]
+        ):
+            self._redraw()
+        else:
+            # only draw the newest segment on top of the previous frame
+            self.fig.canvas.restore_region(self._background)
+            first = max(n - 2, 0)
+            for i, line in enumerate(self.lines):
+                line.set_data(
+                    self.timestamps[first:n], self.positions[first:n, i]
+                )
+                self.ax.draw_artist(line)
+
+        self.fig.canvas.blit(self.ax.bbox)
+        self._background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self.fig.canvas.flush_events()
+
+    def save(self, path):
+        """Render the whole trajectory in one pass and save it to file."""
+
+        fig, ax = plt.subplots()
+        ax.set_prop_cycle(color=self.COLORS)
+        ax.plot(
+            self.timestamps[:self.num_frames],
+            self.positions[:self.num_frames],
+        )
+        ax.set_title("Cube Position")
+        ax.legend(self.LABELS, loc="upper right")
+        fig.savefig(path)
+        plt.close(fig)
+
+
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
@@ -107,7 +439,13 @@ def main():
         "--plot-cube-position",
         "-p",
         action="store_true",
-        help="Plot cube position",
+        help="Plot cube position live.",
+    )
+    parser.add_argument(
+        "--save-cube-position-plot",
+        type=str,
+        metavar="IMAGE_FILE",
+        help="Save a plot of the cube position over the whole log to a file.",
     )
     parser.add_argument(
         "--save-video",
@@ -121,7 +459,8 @@ def main():
         "--camera",
         "-c",
         choices=CAMERA_NAMES,
-        help="Name of the camera.  Used by --save-video.",
+        help="""Name of the camera.  Required by --save-video.  If set, only
+        this camera is decoded and shown.""",
     )
     parser.add_argument(
         "--show_reset",
@@ -129,6 +468,32 @@ def main():
         action="store_true",
         help="Show footage between episodes captured during cube reset.",
     )
+    parser.add_argument(
+        "--start",
+        type=int,
+        help="First time index to show.  Default: first of the log.",
+    )
+    parser.add_argument(
+        "--end",
+        type=int,
+        help="Last time index to show.  Default: last of the log.",
+    )
+    parser.add_argument(
+        "--stride",
+        type=int,
+        default=100,
+        help="""Step between the shown time indices (the robot runs at 1 kHz,
+        the cameras at 10 Hz).  Default: %(default)s.""",
+    )
+    parser.add_argument(
+        "--workers",
+        "-j",
+        type=int,
+        default=0,
+        help="""Number of worker threads for debayering and drawing the
+        frames.  With 0, frames are read, rendered and written sequentially.
+        Default: %(default)s.""",
+    )
     args = parser.parse_args()
 
     if not args.camera_log.exists():
@@ -138,6 +503,21 @@ def main():
         print("{} does not exist.".format(args.robot_log))
         sys.exit(1)
 
+    if args.stride < 1:
+        print("--stride has to be positive.")
+        sys.exit(1)
+    if args.save_video and not args.camera:
+        print("--camera is required for saving video.")
+        sys.exit(1)
+
+    # only decode the selected camera
+    if args.camera:
+        camera_indices = [CAMERA_NAMES.index(args.camera)]
+    else:
+        camera_indices = list(range(len(CAMERA_NAMES)))
+    camera_names = [CAMERA_NAMES[i] for i in camera_indices]
+
+    episode_index = None
     if args.visualize_goal_pose:
         if not args.visualize_goal_pose.exists():
             print("{} does not exist.".format(args.visualize_goal_pose))
@@ -146,11 +526,9 @@ def main():
         with open(args.visualize_goal_pose, "r") as fh:
             goal_dict = json.load(fh)
 
-        goal = goal_dict["goal"]
-
-        goal_pose = trifinger_object_tracking.py_object_tracker.ObjectPose()
-        current_goal = None
+        episode_index = EpisodeIndex(goal_dict["goal"])
 
+    make_cube_visualizer = None
     calib_files = []
     if args.visualize_object_pose or args.visualize_goal_pose:
         for name in CAMERA_NAMES:
@@ -163,7 +541,9 @@ def main():
         model = trifinger_object_tracking.py_object_tracker.get_model_by_name(
             args.object
         )
-        cube_visualizer = tricamera.CubeVisualizer(model, calib_files)
+
+        def make_cube_visualizer():
+            return tricamera.CubeVisualizer(model, calib_files)
 
     log = robot_fingers.TriFingerPlatformWithObjectLog(
         str(args.robot_log), str(args.camera_log)
@@ -173,126 +553,61 @@ def main():
     fps = 10
     interval = 100
 
-    t0 = log.get_first_timeindex()
+    start = log.get_first_timeindex()
+    if args.start is not None:
+        start = max(args.start, start)
+    end = log.get_last_timeindex()
+    if args.end is not None:
+        end = min(args.end, end)
+    time_indices = np.arange(start, end + 1, args.stride)
+    # by default, only show episodes and not resets (skipped before their
+    # observations are read)
+    if episode_index is not None and not args.show_reset:
+        time_indices = episode_index.select(time_indices)
+    if len(time_indices) == 0:
+        print("No frames in the selected time window.")
+        sys.exit(1)
 
     if args.save_video:
-        if not args.camera:
-            print("--camera is required for saving video.")
-            sys.exit(1)
-
-        camera_index = CAMERA_NAMES.index(args.camera)
-        first_img = utils.convert_image(
-            log.get_camera_observation(t0).cameras[0].image
-        )
+        # the raw image has the size of the converted one
+        height, width = log.get_camera_observation(
+            int(time_indices[0])
+        ).cameras[camera_indices[0]].image.shape[:2]
         fourcc = cv2.VideoWriter_fourcc(*"XVID")
         video_writer = cv2.VideoWriter(
-            args.save_video, fourcc, fps, first_img.shape[:2]
+            args.save_video, fourcc, fps, (width, height)
         )
 
-    for t in range(
-        log.get_first_timeindex(), log.get_last_timeindex() + 1, interval
-    ):
-        observation = log.get_camera_observation(t)
-        images = [
-            utils.convert_image(camera.image) for camera in observation.cameras
-        ]
-
-        if args.unfiltered:
-            object_pose = observation.object_pose
-        else:
-            object_pose = observation.filtered_object_pose
-
-        if args.visualize_goal_pose:
-            if goal and t > goal[0]["t_start"]:
-                current_goal = goal.pop(0)
-                if "position" in current_goal:
-                    goal_pose.position = current_goal["position"]
-                    goal_pose.orientation = current_goal.get("orientation", (0, 0, 0, 1))
-                else:
-                    position, orientation = get_pose_from_keypoints(current_goal["keypoints"])
-                    goal_pose.position = position
-                    goal_pose.orientation = orientation
-            if current_goal is not None and t < current_goal["t_end"]:
-                if args.goal_as_circle:
-                    images = cube_visualizer.draw_circle(images, goal_pose, True, opacity=0.6, scale=0.64)
-                else:
-                    images = cube_visualizer.draw_cube(images, goal_pose, True, opacity=0.7)
+    frames = read_frames(log, time_indices, args.unfiltered, episode_index)
+    render = FrameRenderer(args, make_cube_visualizer, camera_indices)
 
-        if args.visualize_object_pose:
-            images = cube_visualizer.draw_cube(images, object_pose, False)
+    cube_position_plot = None
+    if args.plot_cube_position or args.save_cube_position_plot:
+        cube_position_plot = CubePositionPlot(
+            len(time_indices), live=args.plot_cube_position
+        )
 
-        if args.show_confidence:
-            images = [
-                cv2.putText(
-                    image,
-                    "confidence: %.2f" % object_pose.confidence,
-                    (0, image.shape[0] - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (255, 255, 0),
-                )
-                for image in images
-            ]
+    for frame, images in render_frames(frames, render, args.workers):
+        object_pose = frame.object_pose
+        observation = frame.observation
 
-        # by default, only show episodes and not resets
-        if (current_goal is not None and t < current_goal["t_end"]) or args.show_reset:
-            if args.save_video:
-                video_writer.write(images[camera_index])
-            else:
-                for i, name in enumerate(CAMERA_NAMES):
-                    cv2.imshow(name, images[i])
+        if args.save_video:
+            video_writer.write(images[0])
+        else:
+            for name, image in zip(camera_names, images):
+                cv2.imshow(name, image)
 
-                # stop if either "q" or ESC is pressed
-                if cv2.waitKey(interval) in [ord("q"), 27]:  # 27 = ESC
-                    break
+            # stop if either "q" or ESC is pressed
+            if cv2.waitKey(interval) in [ord("q"), 27]:  # 27 = ESC
+                break
 
-            if args.plot_cube_position:
-                plt.scatter(
-                    observation.cameras[0].timestamp,
-                    object_pose.position[0],
-                    color="red",
-                )
-                plt.scatter(
-                    observation.cameras[0].timestamp,
-                    object_pose.position[1],
-                    color="green",
-                )
-                plt.scatter(
-                    observation.cameras[0].timestamp,
-                    object_pose.position[2],
-                    color="blue",
-                )
+        if cube_position_plot is not None:
+            cube_position_plot.add(
+                observation.cameras[0].timestamp, object_pose.position
+            )
 
-                plt.title("Cube Position")
-                legend_elements = [
-                    Line2D(
-                        [0],
-                        [0],
-                        marker="o",
-                        color="w",
-                        label="x",
-                        markerfacecolor="r",
-                    ),
-                    Line2D(
-                        [0],
-                        [0],
-                        marker="o",
-                        color="w",
-                        label="y",
-                        markerfacecolor="g",
-                    ),
-                    Line2D(
-                        [0],
-                        [0],
-                        marker="o",
-                        color="w",
-                        label="z",
-                        markerfacecolor="b",
-                    ),
-                ]
-                plt.legend(handles=legend_elements, loc="upper right")
-
-                plt.pause(0.01)
+    if args.save_cube_position_plot:
+        cube_position_plot.save(args.save_cube_position_plot)
 
 
 if __name__ == "__main__":
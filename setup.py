@@ -8,6 +8,7 @@ setuptools.setup(
     version="1.0.0",
     # Packages to export
     packages=setuptools.find_packages(),
+    package_data={PACKAGE_NAME: ["benchmark_baseline.json"]},
     data_files=[
         # Install "marker" file in package index
         (
@@ -26,7 +27,16 @@ setuptools.setup(
     # scripts here.
     entry_points={
         "console_scripts": [
-            "run_robot = trifinger_example.scripts.run_robot:main"
+            "run_robot = trifinger_example.scripts.run_robot:main",
+            "run_episodes = trifinger_example.scripts.run_episodes:main",
+            "export_log = trifinger_example.scripts.export_log:main",
+            "replay = trifinger_example.scripts.replay:main",
+            "evaluate = trifinger_example.scripts.evaluate:main",
+            "benchmark = trifinger_example.scripts.benchmark:main",
+            "sweep = trifinger_example.scripts.sweep:main",
+            "benchmark_suite = trifinger_example.scripts.benchmark_suite:main",
+            "download_jobs = trifinger_example.scripts.download_jobs:main",
+            "submit_jobs = trifinger_example.scripts.submit_jobs:main",
         ],
     },
 )
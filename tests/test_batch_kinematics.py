@@ -0,0 +1,57 @@
+"""BatchKinematics has to match the pinocchio kinematics."""
+import numpy as np
+
+from trifinger_simulation import trifingerpro_limits
+
+from trifinger_example.batch_kinematics import get_batch_kinematics
+from trifinger_example.robot import get_kinematics
+
+
+def _random_joint_positions(num_samples, seed):
+    limits = trifingerpro_limits.robot_position
+    rng = np.random.RandomState(seed)
+    return rng.uniform(limits.low, limits.high, size=(num_samples, 9))
+
+
+def test_matches_pinocchio():
+    errors = get_batch_kinematics().compare_with(
+        get_kinematics(), num_samples=200, seed=1
+    )
+    assert errors["position_error"] < 1e-12
+    assert errors["jacobian_error"] < 1e-12
+
+
+def test_forward_kinematics_batch():
+    batch_kinematics = get_batch_kinematics()
+    q = _random_joint_positions(20, seed=2)
+    tip_positions = batch_kinematics.forward_kinematics(q)
+    assert tip_positions.shape == (20, 3, 3)
+    for i in range(len(q)):
+        np.testing.assert_allclose(
+            tip_positions[i],
+            get_kinematics().forward_kinematics(q[i]),
+            rtol=0,
+            atol=1e-12,
+        )
+
+
+def test_inverse_kinematics_converges():
+    batch_kinematics = get_batch_kinematics()
+    num_samples = 500
+    # reachable targets, starting from the default position
+    targets = batch_kinematics.forward_kinematics(
+        _random_joint_positions(num_samples, seed=3)
+    )
+    guess = np.tile(trifingerpro_limits.robot_position.default, (num_samples, 1))
+
+    q, errors = batch_kinematics.inverse_kinematics(
+        targets, guess, tolerance=0.005, max_iterations=100
+    )
+
+    tip_errors = np.linalg.norm(errors, axis=2)
+    converged = np.all(tip_errors < 0.005, axis=1)
+    assert np.mean(converged) > 0.99
+    # the returned errors belong to the returned configurations
+    np.testing.assert_allclose(
+        errors, targets - batch_kinematics.forward_kinematics(q), atol=1e-12
+    )
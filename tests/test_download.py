@@ -0,0 +1,209 @@
+"""Tests of trifinger_example.download against a local stand-in server."""
+import base64
+import hashlib
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+from trifinger_example.download import (
+    DownloadError,
+    Downloader,
+    HTTPClient,
+    download_jobs,
+)
+
+
+class _RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the files of the server's root directory with range support.
+
+    The behaviour can be changed through attributes of the server:
+    accept_ranges (announce range support), cut (map from the start of a
+    range to the number of bytes after which its response is cut off),
+    digest (Digest header) and extra_size (added to the announced size).
+    The Range headers of all GET requests are recorded in requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(False)
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("Range"))
+        self._serve(True)
+
+    def _serve(self, send_body):
+        path = os.path.join(self.server.root, self.path.lstrip("/"))
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            data = f.read()
+        size = len(data)
+        start = 0
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, size)
+            )
+            data = data[start:end + 1]
+        else:
+            self.send_response(200)
+        if send_body:
+            self.send_header("Content-Length", str(len(data)))
+        else:
+            self.send_header(
+                "Content-Length", str(len(data) + self.server.extra_size)
+            )
+            if self.server.accept_ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            if self.server.digest is not None:
+                self.send_header("Digest", self.server.digest)
+        self.end_headers()
+        if send_body:
+            cut = self.server.cut.pop(start, None)
+            if cut is not None:
+                # send only part of the body and drop the connection
+                self.wfile.write(data[:cut])
+                self.close_connection = True
+            else:
+                self.wfile.write(data)
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "server"
+    root.mkdir()
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    httpd.root = str(root)
+    httpd.accept_ranges = True
+    httpd.cut = {}
+    httpd.digest = None
+    httpd.extra_size = 0
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, "http://127.0.0.1:{}".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_jobs(server, tmp_path):
+    httpd, url = server
+    job_dir = tmp_path / "server" / "42"
+    (job_dir / "user").mkdir(parents=True)
+    data = os.urandom(10000)
+    (job_dir / "robot_data.dat").write_bytes(data)
+    (job_dir / "user_stdout.txt").write_bytes(b"")
+    (job_dir / "user" / "goals.json").write_bytes(b"{}")
+
+    output_dir = tmp_path / "output"
+    downloader = Downloader(HTTPClient(url), workers=4, chunk_size=1000)
+    files = ["robot_data.dat", "user_stdout.txt", "user/goals.json",
+             "report.json"]
+    status = download_jobs(downloader, ["42"], str(output_dir), files)
+
+    local = output_dir / "42"
+    assert status[str(local / "robot_data.dat")] == "downloaded"
+    assert status[str(local / "user_stdout.txt")] == "downloaded"
+    assert status[str(local / "report.json")] == "missing"
+    assert (local / "robot_data.dat").read_bytes() == data
+    assert (local / "user_stdout.txt").read_bytes() == b""
+    assert (local / "user" / "goals.json").read_bytes() == b"{}"
+    assert not any(name.endswith(".part.json") for name in os.listdir(local))
+
+    status = download_jobs(downloader, ["42"], str(output_dir), files)
+    assert status[str(local / "robot_data.dat")] == "complete"
+    assert status[str(local / "user_stdout.txt")] == "complete"
+
+
+def _download(url, tmp_path, **kwargs):
+    downloader = Downloader(HTTPClient(url), workers=4, chunk_size=1000,
+                            **kwargs)
+    local_path = str(tmp_path / "output" / "robot_data.dat")
+    return downloader.download([("robot_data.dat", local_path)]), local_path
+
+
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_resume(server, tmp_path, accept_ranges):
+    httpd, url = server
+    httpd.accept_ranges = accept_ranges
+    data = os.urandom(10000)
+    (tmp_path / "server" / "robot_data.dat").write_bytes(data)
+    # the response of the range at 3000 (or of the whole file) is cut after
+    # 500 bytes
+    cut_start = 3000 if accept_ranges else 0
+    httpd.cut = {cut_start: 500}
+
+    with pytest.raises(DownloadError):
+        _download(url, tmp_path, retries=0)
+    assert not os.path.exists(str(tmp_path / "output" / "robot_data.dat"))
+
+    httpd.requests = []
+    status, local_path = _download(url, tmp_path)
+    assert status[local_path] == "downloaded"
+    if accept_ranges:
+        assert httpd.requests == ["bytes=3000-3999"]
+    else:
+        assert httpd.requests == ["bytes=500-"]
+    with open(local_path, "rb") as f:
+        assert f.read() == data
+    assert not os.path.exists(local_path + ".part")
+    assert not os.path.exists(local_path + ".part.json")
+
+
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_reject_wrong_checksum(server, tmp_path, accept_ranges):
+    httpd, url = server
+    httpd.accept_ranges = accept_ranges
+    data = os.urandom(10000)
+    (tmp_path / "server" / "robot_data.dat").write_bytes(data)
+    wrong_digest = hashlib.sha256(data + b"x").digest()
+    httpd.digest = "SHA-256=" + base64.b64encode(wrong_digest).decode()
+
+    with pytest.raises(DownloadError, match="Checksum mismatch"):
+        _download(url, tmp_path)
+    local_path = str(tmp_path / "output" / "robot_data.dat")
+    assert not os.path.exists(local_path)
+    # the next run starts from scratch
+    assert not os.path.exists(local_path + ".part.json")
+
+    httpd.digest = "SHA-256=" + base64.b64encode(
+        hashlib.sha256(data).digest()
+    ).decode()
+    status, local_path = _download(url, tmp_path)
+    assert status[local_path] == "downloaded"
+    with open(local_path, "rb") as f:
+        assert f.read() == data
+
+
+def test_reject_wrong_size(server, tmp_path):
+    httpd, url = server
+    # without range support, so the file is not preallocated to the
+    # announced size
+    httpd.accept_ranges = False
+    httpd.extra_size = 10
+    (tmp_path / "server" / "robot_data.dat").write_bytes(os.urandom(10000))
+
+    with pytest.raises(DownloadError, match="10000 bytes instead of 10010"):
+        _download(url, tmp_path)
+    local_path = str(tmp_path / "output" / "robot_data.dat")
+    assert not os.path.exists(local_path)
+    assert not os.path.exists(local_path + ".part.json")
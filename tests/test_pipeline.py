@@ -0,0 +1,111 @@
+"""Tests of trifinger_example.pipeline with the fake local cluster."""
+import json
+import os
+import sys
+
+from trifinger_example.pipeline import (
+    DONE,
+    FINISHED,
+    STATE_FILE,
+    LocalBackend,
+    Pipeline,
+)
+
+
+# writes some data to the job directory given as last argument
+JOB_COMMAND = [
+    sys.executable,
+    "-c",
+    "import os, sys; "
+    "open(os.path.join(sys.argv[1], 'robot_data.dat'), 'wb')"
+    ".write(b'data of ' + os.path.basename(sys.argv[1]).encode())",
+]
+
+
+class _Renderer:
+    """Records the jobs it is called for and their state at that time."""
+
+    def __init__(self, output_dir):
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        self.calls = []
+
+    def __call__(self, job_dir):
+        job_id = os.path.basename(job_dir)
+        with open(self.state_path, "r") as f:
+            state = json.load(f)["jobs"][job_id]["state"]
+        self.calls.append((job_id, state))
+        with open(os.path.join(job_dir, "video.avi"), "wb") as f:
+            f.write(b"video")
+
+
+def _load_state(output_dir):
+    with open(os.path.join(output_dir, STATE_FILE), "r") as f:
+        return json.load(f)
+
+
+def _make_pipeline(output_dir, num_jobs, render, max_running=1):
+    backend = LocalBackend(os.path.join(output_dir, "cluster"), JOB_COMMAND)
+    return Pipeline(
+        backend,
+        output_dir,
+        num_jobs,
+        render=render,
+        poll_interval=0.01,
+        max_running=max_running,
+        start_timeout=10.,
+        run_timeout=10.,
+    )
+
+
+def test_run_jobs(tmp_path):
+    output_dir = str(tmp_path)
+    render = _Renderer(output_dir)
+
+    states = _make_pipeline(output_dir, 3, render, max_running=2).run()
+
+    assert states == {"1": DONE, "2": DONE, "3": DONE}
+    state = _load_state(output_dir)
+    for job_id in ("1", "2", "3"):
+        job = state["jobs"][job_id]
+        assert job["state"] == DONE
+        assert job["start_time"] >= job["submit_time"]
+        assert not job["backend_error"]
+        assert job["error"] is None
+        job_dir = tmp_path / job_id
+        assert (job_dir / "robot_data.dat").read_bytes() == (
+            b"data of " + job_id.encode()
+        )
+        assert json.loads((job_dir / "report.json").read_text()) == {
+            "backend_error": False
+        }
+    assert state["last_poll_time"] is not None
+    # each job is rendered once, after its download
+    assert sorted(render.calls) == [
+        ("1", "downloaded"), ("2", "downloaded"), ("3", "downloaded")
+    ]
+
+
+def test_continue_interrupted_run(tmp_path):
+    output_dir = str(tmp_path)
+    render = _Renderer(output_dir)
+    _make_pipeline(output_dir, 2, render).run()
+
+    # interrupt after job 2 finished on the cluster, before its download
+    state = _load_state(output_dir)
+    state["jobs"]["2"]["state"] = FINISHED
+    with open(os.path.join(output_dir, STATE_FILE), "w") as f:
+        json.dump(state, f)
+    os.remove(os.path.join(output_dir, "2", "robot_data.dat"))
+    render.calls = []
+
+    states = _make_pipeline(output_dir, 3, render).run()
+
+    # job 1 is not submitted or processed again, job 2 is downloaded and
+    # rendered, job 3 is new
+    assert states == {"1": DONE, "2": DONE, "3": DONE}
+    assert sorted(render.calls) == [("2", "downloaded"), ("3", "downloaded")]
+    assert sorted(os.listdir(os.path.join(output_dir, "cluster"))) == [
+        "1", "2", "3", "stderr.txt", "stdout.txt"
+    ]
+    assert (tmp_path / "2" / "robot_data.dat").read_bytes() == b"data of 2"
+    assert _load_state(output_dir)["jobs"]["1"] == state["jobs"]["1"]
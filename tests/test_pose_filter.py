@@ -0,0 +1,96 @@
+"""Tests of trifinger_example.pose_filter."""
+import numpy as np
+
+from trifinger_example.pose_filter import ObjectPoseFilter
+from trifinger_example.utils import ObjectPose
+
+
+ORIENTATION = np.array([0., 0., 0., 1.])
+START = np.array([0.05, -0.02, 0.0325])
+
+
+def _camera_pose(velocity, timestamp, start=START):
+    return ObjectPose(start + velocity * timestamp, ORIENTATION, 1.)
+
+
+def _run(pose_filter, velocity, duration, camera_period=0.1, delay=0.03,
+         start=START):
+    """Filter a cube moving at constant velocity at 1 kHz.
+
+    The camera captures a pose every camera_period, which is available
+    delay after the capture.
+
+    Returns:
+        Array of the prediction errors of all steps.
+    """
+
+    errors = []
+    camera_timestamp = None
+    for step in range(int(duration * 1000)):
+        time = step / 1000.
+        latest = np.floor((time - delay) / camera_period) * camera_period
+        if latest >= 0.:
+            camera_timestamp = latest
+        if camera_timestamp is None:
+            continue
+        pose = pose_filter.filter(
+            camera_timestamp,
+            _camera_pose(velocity, camera_timestamp, start),
+            time,
+        )
+        errors.append(np.linalg.norm(pose.position - (start + velocity * time)))
+    return np.array(errors)
+
+
+def test_constant_velocity():
+    velocity = np.array([0.1, -0.05, 0.])
+    errors = _run(ObjectPoseFilter(), velocity, duration=3.)
+
+    # the latest camera pose is up to 0.13 s old, i.e. up to 15 mm off
+    assert errors[0] > 0.002
+    assert np.all(errors[-1000:] < 1e-4)
+
+
+def test_max_speed():
+    pose_filter = ObjectPoseFilter(max_speed=0.5)
+    velocity = np.array([2., 0., 0.])
+    _run(pose_filter, velocity, duration=1.)
+
+    camera_timestamp = 0.9
+    pose = _camera_pose(velocity, camera_timestamp)
+    first = pose_filter.filter(camera_timestamp, pose, 1.).position.copy()
+    second = pose_filter.filter(camera_timestamp, pose, 1.1).position.copy()
+    speed = np.linalg.norm(second - first) / 0.1
+    assert 0.49 < speed <= 0.5 + 1e-9
+
+
+def test_max_horizon():
+    pose_filter = ObjectPoseFilter(max_horizon=0.3)
+    velocity = np.array([0.1, 0., 0.])
+    _run(pose_filter, velocity, duration=2.)
+
+    camera_timestamp = 1.9
+    pose = _camera_pose(velocity, camera_timestamp)
+    at_horizon = pose_filter.filter(
+        camera_timestamp, pose, camera_timestamp + 0.3
+    ).position.copy()
+    beyond = pose_filter.filter(
+        camera_timestamp, pose, camera_timestamp + 5.
+    ).position.copy()
+    np.testing.assert_allclose(
+        at_horizon, START + velocity * (camera_timestamp + 0.3), atol=1e-6
+    )
+    # held instead of extrapolated to x = 0.74 m
+    np.testing.assert_allclose(beyond, at_horizon, atol=1e-12)
+
+
+def test_reset():
+    pose_filter = ObjectPoseFilter()
+    _run(pose_filter, np.array([0.1, 0., 0.]), duration=2.)
+
+    pose_filter.reset()
+    # the new episode starts with a resting cube elsewhere and its clock at
+    # zero again
+    start = np.array([-0.05, 0.05, 0.0325])
+    errors = _run(pose_filter, np.zeros(3), duration=1., start=start)
+    np.testing.assert_array_equal(errors, 0.)
@@ -0,0 +1,52 @@
+"""Robot.reset() has to start the same episode as a new Robot."""
+import numpy as np
+
+import trifinger_simulation.tasks.move_cube as task
+
+from trifinger_example.robot import Robot
+from trifinger_example.scripts.run_robot import run_episode
+
+
+EPISODE_LENGTH = 1500
+
+
+def _make_robot(seed):
+    np.random.seed(seed)
+    task.seed(seed)
+    return Robot(
+        simulate=True,
+        episode_length=EPISODE_LENGTH,
+        visualization=False,
+        real_time_factor=None,
+        ik_time_budget=None,
+    )
+
+
+def _run(robot):
+    """Run an episode and return the observed states of all steps."""
+
+    states = []
+
+    def record_state(robot, t):
+        robot_observation, object_pose = robot.get_observation(t)
+        states.append(np.concatenate([
+            robot_observation.position,
+            robot_observation.velocity,
+            object_pose.position,
+            object_pose.orientation,
+        ]))
+
+    run_episode(robot, step_callback=record_state)
+    return np.array(states)
+
+
+def test_reset_matches_new_robot():
+    expected = _run(_make_robot(3))
+
+    for previous_seed in (5, 7):
+        robot = _make_robot(previous_seed)
+        _run(robot)
+        np.random.seed(3)
+        task.seed(3)
+        robot.reset()
+        np.testing.assert_array_equal(_run(robot), expected)
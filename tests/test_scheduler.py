@@ -0,0 +1,95 @@
+"""Tests of the replanning rules of trifinger_example.scheduler."""
+import numpy as np
+
+from trifinger_example.scheduler import ControlScheduler
+
+
+class _Robot:
+    """Stand-in for Robot with given camera frame times."""
+
+    def __init__(self, frame_steps=()):
+        self.frame_steps = sorted(frame_steps)
+
+    def get_camera_timestamp(self, t):
+        # timestamp of the latest frame, 0.1 s per frame
+        return 0.1 * sum(1 for step in self.frame_steps if step <= t)
+
+
+class _Policy:
+    """Plans the joint target 10 * <number of the plan> for all joints."""
+
+    def __init__(self):
+        self.plan_steps = []
+
+    def __call__(self, robot, t):
+        position = np.full(9, 10. * len(self.plan_steps))
+        self.plan_steps.append(t)
+        return position, None
+
+
+def _run(scheduler, robot, num_steps):
+    positions = []
+    for t in range(num_steps):
+        position, torque = scheduler.get_action(robot, t)
+        assert torque is None
+        positions.append(position[0])
+    return np.array(positions)
+
+
+def test_replan_on_new_camera_frame():
+    policy = _Policy()
+    scheduler = ControlScheduler(policy)
+    # frames do not arrive exactly every 100 steps
+    robot = _Robot(frame_steps=[97, 205, 301])
+
+    positions = _run(scheduler, robot, 400)
+
+    assert policy.plan_steps == [0, 97, 205, 301]
+    assert scheduler.num_plans == 4
+    # the targets are held until the next plan
+    np.testing.assert_array_equal(positions[:97], 0.)
+    np.testing.assert_array_equal(positions[97:205], 10.)
+    np.testing.assert_array_equal(positions[205:301], 20.)
+    np.testing.assert_array_equal(positions[301:], 30.)
+
+
+def test_replan_at_policy_rate():
+    policy = _Policy()
+    scheduler = ControlScheduler(policy, policy_rate=250)
+    # camera frames are ignored with a policy rate
+    robot = _Robot(frame_steps=[1, 2, 3, 5])
+
+    positions = _run(scheduler, robot, 12)
+
+    assert policy.plan_steps == [0, 4, 8]
+    np.testing.assert_array_equal(
+        positions, [0., 0., 0., 0., 10., 10., 10., 10., 20., 20., 20., 20.]
+    )
+
+
+def test_interpolate():
+    policy = _Policy()
+    scheduler = ControlScheduler(policy, policy_rate=250, interpolate=True)
+
+    positions = _run(scheduler, _Robot(), 12)
+
+    assert policy.plan_steps == [0, 4, 8]
+    # from the last commanded target to the new one over one policy period
+    np.testing.assert_allclose(
+        positions,
+        [0., 0., 0., 0., 2.5, 5., 7.5, 10., 12.5, 15., 17.5, 20.],
+    )
+
+
+def test_reset():
+    policy = _Policy()
+    scheduler = ControlScheduler(policy, policy_rate=250, interpolate=True)
+    _run(scheduler, _Robot(), 6)
+
+    scheduler.reset()
+    positions = _run(scheduler, _Robot(), 4)
+
+    # a new plan in the first step, held instead of interpolated from the
+    # targets of the previous episode
+    assert policy.plan_steps == [0, 4, 0]
+    np.testing.assert_array_equal(positions, 20.)
@@ -0,0 +1,317 @@
+import functools
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+import pinocchio
+
+from trifinger_simulation import trifingerpro_limits
+
+from .robot import TIP_LINK_NAMES, get_finger_urdf_path
+
+
+def _rotation_from_rpy(rpy):
+    """Rotation matrix from URDF roll, pitch, yaw angles."""
+
+    roll, pitch, yaw = rpy
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    return np.array([
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ])
+
+
+def _coordinate_axis(axis):
+    """Index and sign of a unit coordinate axis or None for other axes."""
+
+    nonzero = np.flatnonzero(axis)
+    if len(nonzero) == 1:
+        return nonzero[0], np.sign(axis[nonzero[0]])
+    return None
+
+
+def _rotate_about_axis(rotation, axis, coordinate_axis, angles):
+    """Compute rotation @ R(axis, angle) for a batch of rotations and angles.
+
+    Rotations about coordinate axes (the usual case in URDFs, given by
+    coordinate_axis as returned by _coordinate_axis()) only mix two columns,
+    anything else is done with Rodrigues' formula.
+    """
+
+    sin = np.sin(angles)[:, None]
+    cos = np.cos(angles)[:, None]
+    if coordinate_axis is not None:
+        i, sign = coordinate_axis
+        sin = sign * sin
+        j, k = (i + 1) % 3, (i + 2) % 3
+        result = rotation.copy()
+        result[:, :, j] = cos * rotation[:, :, j] + sin * rotation[:, :, k]
+        result[:, :, k] = cos * rotation[:, :, k] - sin * rotation[:, :, j]
+        return result
+
+    k = np.array([
+        [0., -axis[2], axis[1]],
+        [axis[2], 0., -axis[0]],
+        [-axis[1], axis[0], 0.],
+    ])
+    axis_rotations = (
+        np.eye(3) + sin[:, :, None] * k + (1. - cos[:, :, None]) * (k @ k)
+    )
+    return rotation @ axis_rotations
+
+
+class BatchKinematics:
+    """Kinematics of a Finger robot for batches of joint configurations.
+
+    Pure NumPy counterpart of pinocchio_utils.Kinematics: the kinematic
+    chains of the fingers are read from the URDF and evaluated with array
+    operations over the whole batch, so the cost of a call is dominated by a
+    few dozen NumPy operations, independent of the batch size.
+
+    Joint configurations have shape (B, n_joints), with the joints in the
+    order of the fingers (as in the robot observations).
+    """
+
+    def __init__(self, finger_urdf_path, tip_link_names):
+        """
+        Args:
+            finger_urdf_path:  Path to the URDF file describing the robot.
+            tip_link_names:  Names of the finger tip frames, one per finger.
+        """
+        root = ElementTree.parse(finger_urdf_path).getroot()
+        # child link -> joint
+        joints_by_child = {
+            joint.find("child").get("link"): joint
+            for joint in root.findall("joint")
+        }
+
+        # One chain per finger, from the base to the tip.  Each element is
+        # (translation, rotation, axis, coordinate axis, joint index) of a
+        # revolute joint; the rotation is None if it is the identity and the
+        # last element holds the fixed transformation to the tip (without
+        # axis and index).
+        self.chains = []
+        self.joint_names = []
+        for tip_link_name in tip_link_names:
+            joints = []
+            link = tip_link_name
+            while link in joints_by_child:
+                joint = joints_by_child[link]
+                joints.append(joint)
+                link = joint.find("parent").get("link")
+
+            # fixed joints are merged into the following joint
+            chain = []
+            fixed_translation = np.zeros(3)
+            fixed_rotation = np.eye(3)
+            for joint in reversed(joints):
+                origin = joint.find("origin")
+                xyz = [0., 0., 0.]
+                rpy = [0., 0., 0.]
+                if origin is not None:
+                    xyz = [float(v) for v in origin.get("xyz", "0 0 0").split()]
+                    rpy = [float(v) for v in origin.get("rpy", "0 0 0").split()]
+
+                translation = fixed_translation + fixed_rotation @ xyz
+                rotation = fixed_rotation @ _rotation_from_rpy(rpy)
+                if joint.get("type") == "fixed":
+                    fixed_translation = translation
+                    fixed_rotation = rotation
+                    continue
+
+                axis_element = joint.find("axis")
+                axis = np.array([
+                    float(v) for v in axis_element.get("xyz").split()
+                ])
+                axis /= np.linalg.norm(axis)
+                joint_index = len(self.joint_names)
+                self.joint_names.append(joint.get("name"))
+                chain.append((
+                    translation,
+                    self._nontrivial(rotation),
+                    axis,
+                    _coordinate_axis(axis),
+                    joint_index,
+                ))
+                fixed_translation = np.zeros(3)
+                fixed_rotation = np.eye(3)
+
+            # remaining fixed joints up to the tip
+            chain.append((fixed_translation, None, None, None, None))
+            self.chains.append(chain)
+
+        self.n_fingers = len(self.chains)
+        self.n_joints = len(self.joint_names)
+
+    @staticmethod
+    def _nontrivial(rotation):
+        """Return None for the identity, so it can be skipped."""
+
+        if np.allclose(rotation, np.eye(3)):
+            return None
+        return rotation
+
+    def _evaluate(self, joint_positions, with_jacobians):
+        q = np.asarray(joint_positions, dtype=float)
+        batch_size = q.shape[0]
+
+        tip_positions = np.empty((batch_size, self.n_fingers, 3))
+        if with_jacobians:
+            jacobians = np.zeros(
+                (batch_size, self.n_fingers, 3, self.n_joints)
+            )
+        else:
+            jacobians = None
+
+        identity = np.broadcast_to(np.eye(3), (batch_size, 3, 3))
+        origin = np.zeros((batch_size, 3))
+        for finger, chain in enumerate(self.chains):
+            rotation = identity
+            position = origin
+            # world position and axis of the revolute joints
+            joint_frames = []
+            for (translation, origin_rotation, axis, coordinate_axis,
+                 joint_index) in chain:
+                position = position + rotation @ translation
+                if origin_rotation is not None:
+                    rotation = rotation @ origin_rotation
+                if axis is not None:
+                    joint_frames.append((joint_index, position, rotation @ axis))
+                    rotation = _rotate_about_axis(
+                        rotation, axis, coordinate_axis, q[:, joint_index]
+                    )
+            tip_positions[:, finger] = position
+
+            if with_jacobians:
+                for joint_index, joint_position, joint_axis in joint_frames:
+                    jacobians[:, finger, :, joint_index] = np.cross(
+                        joint_axis, position - joint_position
+                    )
+
+        return tip_positions, jacobians
+
+    def forward_kinematics(self, joint_positions):
+        """Compute finger tip positions.
+
+        Args:
+            joint_positions: Array of shape (B, n_joints).
+
+        Returns:
+            Array of shape (B, n_fingers, 3) with the tip positions.
+        """
+
+        tip_positions, _ = self._evaluate(joint_positions, False)
+        return tip_positions
+
+    def jacobians(self, joint_positions):
+        """Compute finger tip positions and their Jacobians.
+
+        The Jacobians are the linear part of the frame Jacobians in the world
+        frame (LOCAL_WORLD_ALIGNED in pinocchio).
+
+        Args:
+            joint_positions: Array of shape (B, n_joints).
+
+        Returns:
+            Tuple of the tip positions of shape (B, n_fingers, 3) and the
+            Jacobians of shape (B, n_fingers, 3, n_joints).
+        """
+
+        return self._evaluate(joint_positions, True)
+
+    def inverse_kinematics(self, tip_target_positions, joint_angles_guess,
+                           tolerance=0.005, max_iterations=100, damping=1e-3):
+        """Damped least-squares inverse kinematics for a batch.
+
+        All fingers of all configurations are solved together.  Solved
+        configurations are not changed in further iterations.
+
+        Args:
+            tip_target_positions: Array of shape (B, n_fingers, 3).
+            joint_angles_guess: Array of shape (B, n_joints).
+            tolerance: Stop once the error of every tip is below this.
+            max_iterations: Max. number of iterations.
+            damping: Damping factor of the least-squares solution.
+
+        Returns:
+            Tuple of the joint configurations of shape (B, n_joints) and the
+            (x, y, z)-errors of the tips of shape (B, n_fingers, 3).
+        """
+
+        targets = np.asarray(tip_target_positions, dtype=float)
+        q = np.array(joint_angles_guess, dtype=float)
+        damping_matrix = damping ** 2 * np.eye(3)
+
+        for _ in range(max_iterations):
+            tip_positions, jacobians = self.jacobians(q)
+            errors = targets - tip_positions
+            unsolved = np.max(np.linalg.norm(errors, axis=2), axis=1) >= tolerance
+            if not np.any(unsolved):
+                break
+
+            # dq = J^T (J J^T + lambda^2 I)^-1 e, per finger
+            jacobians = jacobians[unsolved]
+            jjt = jacobians @ np.swapaxes(jacobians, 2, 3) + damping_matrix
+            weights = np.linalg.solve(jjt, errors[unsolved][..., None])
+            dq = np.sum(np.swapaxes(jacobians, 2, 3) @ weights, axis=1)
+            q[unsolved] += dq[..., 0]
+        else:
+            errors = targets - self.forward_kinematics(q)
+
+        return q, errors
+
+    def compare_with(self, kinematics, num_samples=100, seed=0):
+        """Compare with a pinocchio_utils.Kinematics object.
+
+        Evaluates both on random joint configurations within the joint
+        limits of the TriFinger Pro.
+
+        Returns:
+            Dictionary with the max. absolute differences of the tip
+            positions and of the Jacobians.
+        """
+
+        limits = trifingerpro_limits.robot_position
+        rng = np.random.RandomState(seed)
+        q = rng.uniform(limits.low, limits.high, size=(num_samples, 9))
+        tip_positions, jacobians = self.jacobians(q)
+
+        position_error = 0.
+        jacobian_error = 0.
+        for i in range(num_samples):
+            reference = np.asarray(kinematics.forward_kinematics(q[i]))
+            position_error = max(
+                position_error, np.max(np.abs(reference - tip_positions[i]))
+            )
+
+            pinocchio.computeJointJacobians(
+                kinematics.robot_model, kinematics.data, q[i]
+            )
+            pinocchio.framesForwardKinematics(
+                kinematics.robot_model, kinematics.data, q[i]
+            )
+            for finger, frame_id in enumerate(kinematics.tip_link_ids):
+                reference = pinocchio.getFrameJacobian(
+                    kinematics.robot_model,
+                    kinematics.data,
+                    frame_id,
+                    pinocchio.ReferenceFrame.LOCAL_WORLD_ALIGNED,
+                )[:3, :]
+                jacobian_error = max(
+                    jacobian_error,
+                    np.max(np.abs(reference - jacobians[i, finger])),
+                )
+
+        return {
+            "position_error": float(position_error),
+            "jacobian_error": float(jacobian_error),
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_kinematics():
+    """Get BatchKinematics of the TriFinger Pro (built once per process)."""
+
+    return BatchKinematics(get_finger_urdf_path(), TIP_LINK_NAMES)
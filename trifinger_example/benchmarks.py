@@ -0,0 +1,327 @@
+"""Benchmarks of the control loop and of the hot paths of the package.
+
+step_allocations() and step_jitter() look at the control step as a whole.
+run_suite() times individual functions (CPU only, the simulation runs
+headless) and can be compared against a stored baseline with compare().
+BASELINE_FILE is the baseline of the current code, recorded on an x86_64
+Linux machine.  Timings of other machines are only comparable to a baseline
+recorded on the same machine.
+"""
+import gc
+import os
+import platform
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+import trifinger_simulation.tasks.move_cube as task
+from trifinger_simulation import trifingerpro_limits
+
+from . import utils
+from .ik import CachedInverseKinematics
+from .robot import Robot, get_kinematics
+from .scripts.run_robot import get_action, run_episode
+from .timing import PERCENTILES
+
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"
+)
+
+def _statistics(samples):
+    return {
+        "mean": float(np.mean(samples)),
+        "max": float(np.max(samples)),
+        "percentiles": {
+            str(p): float(v) for p, v in zip(
+                PERCENTILES, np.percentile(samples, PERCENTILES)
+            )
+        },
+    }
+
+
+def _make_robot(num_steps, difficulty):
+    return Robot(
+        simulate=True,
+        episode_length=num_steps,
+        difficulty=difficulty,
+        visualization=False,
+        real_time_factor=None,
+    )
+
+
+def step_allocations(num_steps=1000, difficulty=1, policy=get_action):
+    """Measure memory allocated per control step.
+
+    Runs an episode with tracemalloc, whose traces are cleared before the
+    policy and before appending the action, so for both parts the peak of
+    the traced memory is the number of bytes allocated (and freed again)
+    within it and the traced memory at the end is what was retained.
+
+    Returns:
+        Dictionary with statistics of the bytes allocated by the policy
+        ("controller") and by the robot and platform ("platform").
+    """
+
+    robot = _make_robot(num_steps, difficulty)
+    controller = np.zeros((num_steps, 2))
+    platform = np.zeros((num_steps, 2))
+    step = [0]
+
+    def traced_policy(robot, t):
+        tracemalloc.clear_traces()
+        action = policy(robot, t)
+        controller[step[0]] = tracemalloc.get_traced_memory()[::-1]
+        tracemalloc.clear_traces()
+        return action
+
+    def step_callback(robot, t):
+        platform[step[0]] = tracemalloc.get_traced_memory()[::-1]
+        step[0] += 1
+
+    tracemalloc.start()
+    try:
+        steps = run_episode(
+            robot, step_callback=step_callback, policy=traced_policy
+        )
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "steps": steps,
+        "unit": "bytes per step",
+        "controller_peak": _statistics(controller[:, 0]),
+        "controller_retained": _statistics(controller[:, 1]),
+        "platform_peak": _statistics(platform[:, 0]),
+        "platform_retained": _statistics(platform[:, 1]),
+    }
+
+
+def step_jitter(num_steps=5000, difficulty=1, policy=get_action):
+    """Measure the durations of the control steps and garbage collections.
+
+    Returns:
+        Dictionary with statistics of the step durations (in s), their
+        standard deviation and the number of garbage collections per
+        generation during the episode.
+    """
+
+    robot = _make_robot(num_steps, difficulty)
+    collections = [0, 0, 0]
+
+    def count_collections(phase, info):
+        if phase == "start":
+            collections[info["generation"]] += 1
+
+    gc.callbacks.append(count_collections)
+    try:
+        steps = run_episode(robot, policy=policy)
+    finally:
+        gc.callbacks.remove(count_collections)
+
+    durations = robot.timer.get_samples("step")
+    result = _statistics(durations)
+    result.update({
+        "steps": steps,
+        "unit": "s",
+        "std": float(np.std(durations)),
+        "gc_collections": collections,
+        "overruns": robot.timer.overruns,
+    })
+    return result
+
+
+def _benchmark_to_world_space(num_calls):
+    pose = task.Pose(
+        position=np.array([0.05, -0.02, 0.0325]),
+        orientation=utils.random_yaw_orientation(),
+    )
+    x_local = np.array([0., 0.0425, 0.])
+    durations = np.empty(num_calls)
+    for i in range(num_calls):
+        start = perf_counter()
+        utils.to_world_space(x_local, pose)
+        durations[i] = perf_counter() - start
+    return durations
+
+
+def _benchmark_random_yaw_orientation(num_calls):
+    durations = np.empty(num_calls)
+    for i in range(num_calls):
+        start = perf_counter()
+        utils.random_yaw_orientation()
+        durations[i] = perf_counter() - start
+    return durations
+
+
+def _benchmark_robot_construction(num_calls):
+    durations = np.empty(num_calls)
+    for i in range(num_calls):
+        start = perf_counter()
+        robot = _make_robot(10, 1)
+        durations[i] = perf_counter() - start
+        del robot
+    return durations
+
+
+def _benchmark_robot_reset(num_calls):
+    robot = _make_robot(10, 1)
+    durations = np.empty(num_calls)
+    for i in range(num_calls):
+        start = perf_counter()
+        robot.reset()
+        durations[i] = perf_counter() - start
+    return durations
+
+
+def _benchmark_get_action(num_calls):
+    robot = _make_robot(num_calls, 1)
+    durations = []
+
+    def timed_get_action(robot, t):
+        start = perf_counter()
+        action = get_action(robot, t)
+        durations.append(perf_counter() - start)
+        return action
+
+    run_episode(robot, policy=timed_get_action)
+    return np.array(durations)
+
+
+def _benchmark_inverse_kinematics(num_calls):
+    kinematics = get_kinematics()
+    ik = CachedInverseKinematics(kinematics, time_budget=None)
+    limits = trifingerpro_limits.robot_position
+    rng = np.random.RandomState(0)
+    targets = [
+        kinematics.forward_kinematics(rng.uniform(limits.low, limits.high))
+        for _ in range(num_calls)
+    ]
+    durations = np.empty(num_calls)
+    for i, target in enumerate(targets):
+        # solve from the default position every time, without cache
+        ik.reset()
+        start = perf_counter()
+        ik.inverse_kinematics(target, limits.default)
+        durations[i] = perf_counter() - start
+    return durations
+
+
+def _benchmark_viewer_frame(num_calls):
+    """Per-frame image processing of the log viewer on synthetic images.
+
+    Mirrors FrameRenderer of the viewer without the overlays, which need
+    the object tracking package: debayer the three raw camera images (like
+    trifinger_cameras.utils.convert_image) and draw the confidence text.
+    """
+
+    import cv2
+
+    rng = np.random.RandomState(0)
+    raw_images = [
+        rng.randint(0, 256, size=(540, 720), dtype=np.uint8)
+        for _ in range(3)
+    ]
+    durations = np.empty(num_calls)
+    for i in range(num_calls):
+        start = perf_counter()
+        images = [
+            cv2.cvtColor(image, cv2.COLOR_BAYER_BG2BGR)
+            for image in raw_images
+        ]
+        for image in images:
+            cv2.putText(
+                image,
+                "confidence: %.2f" % 0.9,
+                (0, image.shape[0] - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 255, 0),
+            )
+        durations[i] = perf_counter() - start
+    return durations
+
+
+# name -> (function(num_calls) returning the durations, default num_calls)
+SUITE = {
+    "to_world_space": (_benchmark_to_world_space, 10000),
+    "random_yaw_orientation": (_benchmark_random_yaw_orientation, 2000),
+    "robot_construction": (_benchmark_robot_construction, 5),
+    "robot_reset": (_benchmark_robot_reset, 50),
+    "get_action": (_benchmark_get_action, 2000),
+    "inverse_kinematics": (_benchmark_inverse_kinematics, 200),
+    "viewer_frame": (_benchmark_viewer_frame, 50),
+}
+
+
+def run_suite(names=None, scale=1.):
+    """Run the benchmarks of SUITE.
+
+    Benchmarks whose dependencies are not installed are skipped.
+
+    Args:
+        names: Names of the benchmarks to run (default: all).
+        scale: Factor for the number of calls of each benchmark.
+
+    Returns:
+        Dictionary with the statistics (in s per call) of each benchmark and
+        information about the machine.
+    """
+
+    if names is None:
+        names = list(SUITE)
+
+    benchmarks = {}
+    skipped = []
+    for name in names:
+        function, num_calls = SUITE[name]
+        try:
+            durations = function(max(int(num_calls * scale), 1))
+        except ImportError:
+            skipped.append(name)
+            continue
+        benchmarks[name] = {
+            "calls": len(durations),
+            "median": float(np.median(durations)),
+            "mean": float(np.mean(durations)),
+            "min": float(np.min(durations)),
+            "p90": float(np.percentile(durations, 90)),
+        }
+
+    return {
+        "unit": "s",
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "benchmarks": benchmarks,
+        "skipped": skipped,
+    }
+
+
+def compare(results, baseline, threshold=0.25):
+    """Compare suite results with a baseline.
+
+    A benchmark counts as regression if its median is more than threshold
+    (relative) above the median of the baseline.  Benchmarks missing in the
+    baseline are ignored.
+
+    Returns:
+        List of dictionaries with name, median, baseline median and ratio
+        of the regressions.
+    """
+
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"]
+        if ratio > 1. + threshold:
+            regressions.append({
+                "name": name,
+                "median": result["median"],
+                "baseline_median": reference["median"],
+                "ratio": ratio,
+            })
+    return regressions
@@ -0,0 +1,181 @@
+"""Rate-limited diagnostic output that does not block the control loop.
+
+Usage::
+
+    diagnostics = DiagnosticLog("/output/diagnostics", rate_limits={"target": 10})
+    diagnostics.log("target", t, position=target[0])
+    ...
+    diagnostics.close()
+
+Records are dropped right away if their channel exceeded its rate, so a
+suppressed call only costs a clock read and a few dictionary lookups.
+Accepted records are put into a bounded queue (dropped if it is full) and
+written by a background thread, either as JSON lines (diagnostics.jsonl, one
+object per record with the keys channel, time, t and the fields) or binary
+(per channel, <channel>.bin with float64 rows [time, t, fields...] and
+<channel>.json with the layout, see load_channel()).
+"""
+import json
+import os
+import queue
+import threading
+import time
+from time import perf_counter
+
+import numpy as np
+
+
+JSONL_FILE = "diagnostics.jsonl"
+
+# queued instead of a (channel, time, t, fields) record to stop the writer
+_STOP = None
+
+
+class DiagnosticLog:
+    """Structured diagnostic records, written by a background thread."""
+
+    def __init__(self, path, rate_limits=None, default_rate=10.,
+                 binary=False, max_queue_size=10000):
+        """
+        Args:
+            path: Directory to which the records are written.
+            rate_limits: Dictionary mapping channel names to the max. number
+                of records per second.
+            default_rate: Max. records per second of other channels.
+            binary: Write binary files instead of JSON lines.
+            max_queue_size: Max. number of records waiting to be written.
+        """
+        self.path = path
+        self.rate_limits = dict(rate_limits or {})
+        self.default_rate = default_rate
+        self.binary = binary
+
+        # records dropped by the rate limits and because the queue was full
+        self.suppressed = 0
+        self.dropped = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._min_interval = {}
+        self._last_time = {}
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def log(self, channel, t, **fields):
+        """Log a record, unless the channel exceeded its rate.
+
+        Args:
+            channel: Name of the channel.
+            t: Time index of the record.
+            fields: Numbers or arrays.  Arrays are copied, so buffers can be
+                reused.
+
+        Returns:
+            True if the record was queued.
+        """
+
+        now = perf_counter()
+        min_interval = self._min_interval.get(channel)
+        if min_interval is None:
+            rate = self.rate_limits.get(channel, self.default_rate)
+            min_interval = self._min_interval[channel] = 1. / rate
+        last_time = self._last_time.get(channel)
+        if last_time is not None and now - last_time < min_interval:
+            self.suppressed += 1
+            return False
+        self._last_time[channel] = now
+
+        record = (
+            channel,
+            time.time(),
+            t,
+            {name: np.array(value) for name, value in fields.items()},
+        )
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self):
+        """Write the remaining records and stop the thread."""
+
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        # channel -> open file (only one file with JSON lines)
+        self._files = {}
+        write = self._write_binary if self.binary else self._write_jsonl
+
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            write(record)
+            # write through once the queue is drained
+            if self._queue.empty():
+                for f in self._files.values():
+                    f.flush()
+
+        for f in self._files.values():
+            f.close()
+
+    def _write_jsonl(self, record):
+        channel, timestamp, t, fields = record
+        f = self._files.get(JSONL_FILE)
+        if f is None:
+            f = self._files[JSONL_FILE] = open(
+                os.path.join(self.path, JSONL_FILE), "a"
+            )
+        entry = {"channel": channel, "time": timestamp, "t": t}
+        entry.update((name, value.tolist()) for name, value in fields.items())
+        f.write(json.dumps(entry) + "\n")
+
+    def _write_binary(self, record):
+        channel, timestamp, t, fields = record
+        f = self._files.get(channel)
+        if f is None:
+            layout = {
+                "columns": ["time", "t"],
+                "fields": [
+                    {"name": name, "shape": list(value.shape)}
+                    for name, value in fields.items()
+                ],
+            }
+            with open(os.path.join(self.path, channel + ".json"), "w") as lf:
+                json.dump(layout, lf, indent=4)
+            f = self._files[channel] = open(
+                os.path.join(self.path, channel + ".bin"), "ab"
+            )
+        row = [np.array([timestamp, t], dtype=np.float64)]
+        row.extend(
+            value.astype(np.float64).ravel() for value in fields.values()
+        )
+        np.concatenate(row).tofile(f)
+
+
+def load_channel(path, channel):
+    """Load a channel written with binary=True.
+
+    Returns:
+        Dictionary with arrays time, t and one per field (with one row per
+        record).  A channel has to log the same fields in every record.
+    """
+
+    with open(os.path.join(path, channel + ".json"), "r") as f:
+        layout = json.load(f)
+
+    sizes = [int(np.prod(field["shape"])) for field in layout["fields"]]
+    data = np.fromfile(os.path.join(path, channel + ".bin"), dtype=np.float64)
+    data = data.reshape(-1, 2 + sum(sizes))
+
+    columns = {"time": data[:, 0], "t": data[:, 1].astype(np.int64)}
+    offset = 2
+    for field, size in zip(layout["fields"], sizes):
+        columns[field["name"]] = data[:, offset:offset + size].reshape(
+            (-1,) + tuple(field["shape"])
+        )
+        offset += size
+    return columns
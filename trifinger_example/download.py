@@ -0,0 +1,441 @@
+"""Download of job data from the robot cluster.
+
+Files are fetched over keep-alive HTTP(S) connections (one per worker
+thread) and split into byte ranges that are downloaded in parallel, also
+across files and jobs.  Each file is written to <file>.part, next to a
+<file>.part.json that records the finished ranges, so an interrupted
+download continues where it stopped.  Files for which the server does not
+report size and range support are fetched as a whole, an interrupted
+transfer of such a file is continued with an open-ended range request.
+Once complete, the size and (if known) the checksum are verified before the
+file gets its final name.
+
+The server is only assumed to be a plain HTTP server with basic auth, so
+any local HTTP server serving a directory of job data can stand in for the
+cluster (set base_url accordingly).
+"""
+import base64
+import hashlib
+import http.client
+import json
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+BASE_URL = "https://robots.real-robot-challenge.com/output/{username}/data"
+
+# files of a job, relative to its directory
+JOB_FILES = [
+    "report.json",
+    "info.json",
+    "goal.json",
+    "robot_data.dat",
+    "camera_data.dat",
+    "camera60.yml",
+    "camera180.yml",
+    "camera300.yml",
+    "user_stderr.txt",
+    "user_stdout.txt",
+    "user/goals.json",
+]
+
+_BLOCK_SIZE = 2**20
+
+
+class DownloadError(Exception):
+    pass
+
+
+class HTTPClient:
+    """Keep-alive HTTP(S) connections to a server, one per thread."""
+
+    def __init__(self, base_url, username=None, password=None, timeout=60.):
+        """
+        Args:
+            base_url: URL under which the paths are requested.
+            username: User name for basic auth (None for no auth).
+            password: Password for basic auth.
+            timeout: Timeout (in s) of the socket operations.
+        """
+        parts = urllib.parse.urlsplit(base_url)
+        if parts.scheme == "https":
+            self._connection_class = http.client.HTTPSConnection
+        elif parts.scheme == "http":
+            self._connection_class = http.client.HTTPConnection
+        else:
+            raise ValueError("Unsupported URL '{}'.".format(base_url))
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+
+        self.headers = {}
+        if username is not None:
+            credentials = "{}:{}".format(username, password).encode()
+            self.headers["Authorization"] = (
+                "Basic " + base64.b64encode(credentials).decode()
+            )
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connection_class(
+                self.netloc, timeout=self.timeout
+            )
+        return connection
+
+    def request(self, method, path, headers=None):
+        """Send a request for a path relative to the base URL.
+
+        The body of the response has to be read before the next request of
+        the same thread.
+        """
+
+        url = urllib.parse.quote(self.base_path + "/" + path.lstrip("/"))
+        all_headers = dict(self.headers)
+        if headers:
+            all_headers.update(headers)
+
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, url, headers=all_headers)
+                return connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                # the server may have closed the kept-alive connection
+                connection.close()
+                self._local.connection = None
+                if attempt == 1:
+                    raise
+
+    def head(self, path):
+        """Get status and headers of a path."""
+
+        response = self.request("HEAD", path)
+        response.read()
+        return response.status, response.headers
+
+    def exists(self, path):
+        """Check if a file or directory exists on the server."""
+
+        status, _ = self.head(path)
+        return status in (200, 301)
+
+    def get(self, path):
+        """Get the whole content of a (small) file."""
+
+        response = self.request("GET", path)
+        data = response.read()
+        if response.status != 200:
+            raise DownloadError(
+                "GET {} failed with status {}.".format(path, response.status)
+            )
+        return data
+
+
+def _server_checksum(headers):
+    """Get (algorithm, digest) from Digest or Content-MD5 header or None."""
+
+    for entry in headers.get("Digest", "").split(","):
+        algorithm, _, value = entry.strip().partition("=")
+        if algorithm.lower() == "sha-256" and value:
+            return "sha256", base64.b64decode(value).hex()
+    content_md5 = headers.get("Content-MD5")
+    if content_md5:
+        return "md5", base64.b64decode(content_md5).hex()
+    return None
+
+
+class _FileDownload:
+    """State of the download of one file."""
+
+    def __init__(self, remote_path, local_path, size, validator, ranges,
+                 checksum):
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.part_path = local_path + ".part"
+        self.state_path = local_path + ".part.json"
+        self.size = size
+        self.validator = validator
+        self.ranges = ranges
+        self.checksum = checksum
+        self.done = set()
+        self.failed = False
+        self.resumed = False
+        self._lock = threading.RLock()
+
+    def load_state(self):
+        """Restore the state of a previous run of the same file."""
+
+        if not (
+            os.path.exists(self.state_path) and os.path.exists(self.part_path)
+        ):
+            return
+        with open(self.state_path, "r") as f:
+            state = json.load(f)
+        if state["size"] == self.size and state["validator"] == self.validator:
+            self.done = {tuple(r) for r in state["done"]}
+            self.resumed = True
+
+    def mark_done(self, byte_range):
+        with self._lock:
+            self.done.add(byte_range)
+            self.save_state()
+
+    def save_state(self):
+        with self._lock:
+            state = {
+                "size": self.size,
+                "validator": self.validator,
+                "done": sorted(self.done),
+            }
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(self.state_path + ".tmp", self.state_path)
+
+    def remove_state(self):
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def pending(self):
+        return [r for r in self.ranges if r not in self.done]
+
+
+class Downloader:
+    """Parallel, resumable download of files from an HTTPClient."""
+
+    def __init__(self, client, workers=8, chunk_size=32 * 2**20, retries=3):
+        """
+        Args:
+            client: HTTPClient of the server.
+            workers: Number of parallel transfers.
+            chunk_size: Size (in bytes) of the ranges of large files.
+            retries: Number of retries of a failed range.
+        """
+        self.client = client
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.retries = retries
+
+    def _prepare(self, remote_path, local_path, expected_sha256):
+        """Get _FileDownload of a file, "missing" or "complete"."""
+
+        status, headers = self.client.head(remote_path)
+        if status in (401, 403):
+            raise DownloadError(
+                "Access to {} denied (status {}).".format(remote_path, status)
+            )
+        if status != 200:
+            return "missing"
+
+        length = headers.get("Content-Length")
+        size = int(length) if length is not None else None
+        checksum = _server_checksum(headers)
+        if expected_sha256 is not None:
+            checksum = ("sha256", expected_sha256)
+
+        if (
+            size is not None
+            and os.path.exists(local_path)
+            and os.path.getsize(local_path) == size
+            and (checksum is None or _file_checksum(local_path, checksum[0])
+                 == checksum[1])
+        ):
+            return "complete"
+
+        if size is not None and headers.get("Accept-Ranges") == "bytes":
+            ranges = [
+                (start, min(start + self.chunk_size, size) - 1)
+                for start in range(0, size, self.chunk_size)
+            ]
+        else:
+            # no ranges, the file is transferred as a whole and an
+            # interrupted transfer continued with an open-ended range
+            ranges = [(0, None)]
+        validator = headers.get("ETag") or headers.get("Last-Modified")
+        download = _FileDownload(
+            remote_path, local_path, size, validator, ranges, checksum
+        )
+        download.load_state()
+        if not download.resumed:
+            os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+            with open(download.part_path, "wb") as f:
+                # a file fetched as a whole grows while it is written
+                if size and ranges != [(0, None)]:
+                    f.truncate(size)
+            # the state identifies the version of the file in .part, so it
+            # is written before any data
+            download.save_state()
+        return download
+
+    def _fetch_range(self, download, byte_range):
+        start, end = byte_range
+
+        for attempt in range(self.retries + 1):
+            headers = {}
+            if end is not None:
+                headers["Range"] = "bytes={}-{}".format(start, end)
+            else:
+                # continue after the data of an interrupted transfer
+                start = os.path.getsize(download.part_path)
+                if start > 0:
+                    headers["Range"] = "bytes={}-".format(start)
+            try:
+                response = self.client.request(
+                    "GET", download.remote_path, headers
+                )
+                if end is None and start > 0 and response.status == 416:
+                    # the interrupted transfer was complete already
+                    response.read()
+                    download.mark_done(byte_range)
+                    return
+                if end is None and response.status == 200:
+                    # the server ignored the range, start over
+                    start = 0
+                    expected_status = 200
+                else:
+                    expected_status = 206 if headers else 200
+                if response.status != expected_status:
+                    response.read()
+                    raise DownloadError(
+                        "GET {} ({}) failed with status {}.".format(
+                            download.remote_path,
+                            headers.get("Range", "whole file"),
+                            response.status,
+                        )
+                    )
+                fd = os.open(download.part_path, os.O_WRONLY)
+                try:
+                    if end is None:
+                        os.ftruncate(fd, start)
+                    offset = start
+                    while True:
+                        block = response.read(_BLOCK_SIZE)
+                        if not block:
+                            break
+                        os.pwrite(fd, block, offset)
+                        offset += len(block)
+                finally:
+                    os.close(fd)
+                expected_end = end + 1 if end is not None else download.size
+                if expected_end is not None and offset != expected_end:
+                    raise DownloadError(
+                        "Incomplete range of {}.".format(download.remote_path)
+                    )
+                download.mark_done(byte_range)
+                return
+            except (DownloadError, http.client.HTTPException, OSError):
+                if attempt == self.retries:
+                    download.failed = True
+                    raise
+
+    def _finish(self, download):
+        if download.size is not None:
+            size = os.path.getsize(download.part_path)
+            if size != download.size:
+                download.remove_state()
+                raise DownloadError(
+                    "{} has {} bytes instead of {}.".format(
+                        download.remote_path, size, download.size
+                    )
+                )
+        if download.checksum is not None:
+            algorithm, expected = download.checksum
+            if _file_checksum(download.part_path, algorithm) != expected:
+                # start from scratch next time
+                download.remove_state()
+                raise DownloadError(
+                    "Checksum mismatch of {}.".format(download.remote_path)
+                )
+        os.replace(download.part_path, download.local_path)
+        download.remove_state()
+
+    def download(self, files):
+        """Download files in parallel.
+
+        Args:
+            files: List of (remote path, local path) or (remote path, local
+                path, expected SHA-256 hex digest) tuples.
+
+        Returns:
+            Dictionary mapping the local paths to "downloaded", "complete"
+            (was already there) or "missing" (not on the server).
+
+        Raises:
+            DownloadError: If a file could not be downloaded (after the
+                other files are done).  Finished ranges are kept for the
+                next attempt.
+        """
+
+        status = {}
+        downloads = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            prepared = executor.map(
+                lambda f: self._prepare(f[0], f[1], f[2] if len(f) > 2 else None),
+                files,
+            )
+            for f, download in zip(files, prepared):
+                if isinstance(download, str):
+                    status[f[1]] = download
+                else:
+                    downloads.append(download)
+
+            futures = [
+                executor.submit(self._fetch_range, download, byte_range)
+                for download in downloads
+                for byte_range in download.pending()
+            ]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+
+        for download in downloads:
+            if download.failed:
+                continue
+            try:
+                self._finish(download)
+                status[download.local_path] = "downloaded"
+            except DownloadError as e:
+                errors.append(e)
+
+        if errors:
+            raise DownloadError(
+                "{} transfers failed, first error: {}".format(
+                    len(errors), errors[0]
+                )
+            )
+        return status
+
+
+def _file_checksum(path, algorithm):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_jobs(downloader, job_ids, output_dir, files=JOB_FILES):
+    """Download the data of several jobs at once.
+
+    The files of job <id> are written to <output_dir>/<id>/.
+
+    Returns:
+        Dictionary mapping the local paths to their status, see
+        Downloader.download.
+    """
+
+    transfers = [
+        (
+            "{}/{}".format(job_id, name),
+            os.path.join(output_dir, str(job_id), name),
+        )
+        for job_id in job_ids
+        for name in files
+    ]
+    return downloader.download(transfers)
@@ -0,0 +1,180 @@
+import functools
+import multiprocessing
+from time import time
+
+import numpy as np
+
+import trifinger_simulation.tasks.move_cube as task
+
+from .robot import Robot, get_kinematics
+from .scripts import run_robot
+from .scripts.run_robot import run_episode
+
+
+# (settings, Robot) of the last episode of this process, see _get_robot
+_last_robot = None
+
+
+def _get_robot(episode_length, difficulty, ik_max_iterations):
+    """Get a headless, unpaced simulated Robot for a new episode.
+
+    The Robot of the previous episode in this process is reset and reused if
+    it has the same settings, which is much faster than creating a new one.
+    """
+
+    global _last_robot
+    settings = (episode_length, difficulty, ik_max_iterations)
+    if _last_robot is not None and _last_robot[0] == settings:
+        robot = _last_robot[1]
+        robot.reset()
+    else:
+        robot = Robot(
+            simulate=True,
+            episode_length=episode_length,
+            difficulty=difficulty,
+            visualization=False,
+            real_time_factor=None,
+            ik_max_iterations=ik_max_iterations,
+        )
+        _last_robot = (settings, robot)
+    return robot
+
+
+def full_parameters(parameters=None):
+    """Complete parameters of run_seeded_episode with the defaults."""
+
+    full = dict(run_robot.DEFAULT_PARAMETERS, ik_max_iterations=100)
+    if parameters:
+        unknown = set(parameters) - set(full)
+        if unknown:
+            raise ValueError(
+                "Unknown parameters: {}".format(", ".join(sorted(unknown)))
+            )
+        full.update(parameters)
+    return full
+
+
+def run_seeded_episode(seed, episode_length=10000, difficulty=1,
+                       parameters=None):
+    """Run one headless, unpaced episode in simulation.
+
+    The seed determines the goal and the initial orientation of the cube.
+    The episode is scored like in the challenge: the reward of a step is the
+    negative move_cube.evaluate_state cost of the observed cube pose.
+    parameters can set the constants of get_action (see
+    run_robot.set_parameters) and ik_max_iterations of the Robot.
+    Returns a dictionary with the results of the episode.
+    """
+
+    parameters = full_parameters(parameters)
+    controller_parameters = dict(parameters)
+    ik_max_iterations = controller_parameters.pop("ik_max_iterations")
+    run_robot.set_parameters(**controller_parameters)
+
+    np.random.seed(seed)
+    task.seed(seed)
+
+    start_time = time()
+    robot = _get_robot(episode_length, difficulty, ik_max_iterations)
+
+    reward = 0.
+
+    def accumulate_reward(robot, t):
+        nonlocal reward
+        _, object_pose = robot.get_observation(t)
+        reward -= task.evaluate_state(robot.goal, object_pose, difficulty)
+
+    t = run_episode(robot, step_callback=accumulate_reward)
+    _, object_pose = robot.get_observation(t)
+
+    return {
+        "seed": seed,
+        "difficulty": difficulty,
+        "steps": t,
+        "wall_time": time() - start_time,
+        "goal": {
+            "position": robot.goal.position.tolist(),
+            "orientation": robot.goal.orientation.tolist(),
+        },
+        "object_pose": {
+            "position": np.asarray(object_pose.position).tolist(),
+            "orientation": np.asarray(object_pose.orientation).tolist(),
+        },
+        "position_error": float(
+            np.linalg.norm(object_pose.position - robot.goal.position)
+        ),
+        "reward": reward,
+        "final_cost": float(
+            task.evaluate_state(robot.goal, object_pose, difficulty)
+        ),
+        "ik_time_per_step": float(
+            np.sum(robot.timer.get_samples("inverse_kinematics")) / t
+        ),
+        "parameters": parameters,
+    }
+
+
+def _run_task(seed_and_parameters, episode_length, difficulty):
+    seed, parameters = seed_and_parameters
+    return run_seeded_episode(seed, episode_length, difficulty, parameters)
+
+
+def _map_unordered(function, tasks, processes):
+    """Map function over the tasks on a process pool, in finish order."""
+
+    # build the kinematics model once here, so forked workers inherit it
+    # (with other start methods, each worker builds it once on start)
+    get_kinematics()
+    with multiprocessing.Pool(processes, initializer=get_kinematics) as pool:
+        for result in pool.imap_unordered(function, tasks, chunksize=1):
+            yield result
+
+
+def iter_episodes(seeds, episode_length=10000, difficulty=1, processes=None):
+    """Run seeded episodes in parallel on a process pool.
+
+    Yields the per-episode results in the order in which the episodes
+    finish.
+    """
+
+    run = functools.partial(
+        run_seeded_episode,
+        episode_length=episode_length,
+        difficulty=difficulty,
+    )
+    return _map_unordered(run, seeds, processes)
+
+
+def iter_parameter_episodes(tasks, episode_length=10000, difficulty=1,
+                            processes=None):
+    """Run episodes with different parameters in parallel on a process pool.
+
+    Args:
+        tasks: Iterable of (seed, parameters) tuples, see
+            run_seeded_episode.
+
+    Yields the per-episode results in the order in which the episodes
+    finish.
+    """
+
+    run = functools.partial(
+        _run_task,
+        episode_length=episode_length,
+        difficulty=difficulty,
+    )
+    return _map_unordered(run, tasks, processes)
+
+
+def run_episodes(seeds, episode_length=10000, difficulty=1, processes=None):
+    """Run seeded episodes in parallel on a process pool.
+
+    Returns the list of per-episode results in order of the seeds.
+    """
+
+    results = {
+        result["seed"]: result
+        for result in iter_episodes(
+            seeds, episode_length, difficulty, processes
+        )
+    }
+    return [results[seed] for seed in seeds]
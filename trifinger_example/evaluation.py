@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .episode_runner import iter_episodes
+
+
+# an episode counts as success if the final cube position is closer to the
+# goal than this (in m)
+SUCCESS_POSITION_ERROR = 0.02
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "trifinger_example", "evaluation"
+)
+
+
+# modules (relative to the package) that determine the result of an episode
+CONTROLLER_MODULES = [
+    "episode_runner.py",
+    "ik.py",
+    "impedance.py",
+    "pose_filter.py",
+    "robot.py",
+    "scheduler.py",
+    "scripts/run_robot.py",
+    "utils.py",
+]
+
+
+def controller_hash():
+    """Get hash of the source code of the controller modules."""
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sha = hashlib.sha256()
+    for name in CONTROLLER_MODULES:
+        sha.update(name.encode())
+        with open(os.path.join(package_dir, name), "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """Episode results on disk, one JSON file per episode.
+
+    Results are keyed by controller code hash, difficulty, episode length
+    and seed (which together with the difficulty determines the goal).
+    """
+
+    def __init__(self, cache_dir, code_hash):
+        self.directory = os.path.join(cache_dir, code_hash)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, seed, difficulty, episode_length):
+        return os.path.join(
+            self.directory,
+            "difficulty{}_length{}_seed{}.json".format(
+                difficulty, episode_length, seed
+            ),
+        )
+
+    def load(self, seed, difficulty, episode_length):
+        """Get cached result or None if there is none."""
+
+        path = self._path(seed, difficulty, episode_length)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def store(self, result, episode_length):
+        """Store result of an episode."""
+
+        path = self._path(result["seed"], result["difficulty"], episode_length)
+        # write to temporary file first, so an interrupted run does not
+        # leave a broken cache entry
+        with open(path + ".tmp", "w") as f:
+            json.dump(result, f, indent=4)
+        os.replace(path + ".tmp", path)
+
+
+def evaluate(seeds, difficulty=1, episode_length=10000, processes=None,
+             cache_dir=DEFAULT_CACHE_DIR):
+    """Evaluate the controller on the goals given by the seeds.
+
+    Only episodes without cached result for the current controller code are
+    run (in parallel).
+
+    Returns:
+        Tuple of the per-episode results (in order of the seeds) and the
+        number of episodes that were run.
+    """
+
+    cache = ResultCache(cache_dir, controller_hash())
+    results = {
+        seed: cache.load(seed, difficulty, episode_length) for seed in seeds
+    }
+    missing = [seed for seed, result in results.items() if result is None]
+
+    if missing:
+        for result in iter_episodes(
+            missing, episode_length, difficulty, processes
+        ):
+            cache.store(result, episode_length)
+            results[result["seed"]] = result
+
+    return [results[seed] for seed in seeds], len(missing)
+
+
+def aggregate(results):
+    """Summarize the results of several episodes."""
+
+    rewards = np.array([result["reward"] for result in results])
+    final_costs = np.array([result["final_cost"] for result in results])
+    position_errors = np.array(
+        [result["position_error"] for result in results]
+    )
+    return {
+        "episodes": len(results),
+        "mean_reward": float(np.mean(rewards)),
+        "std_reward": float(np.std(rewards)),
+        "mean_final_cost": float(np.mean(final_costs)),
+        "mean_position_error": float(np.mean(position_errors)),
+        "success_rate": float(
+            np.mean(position_errors < SUCCESS_POSITION_ERROR)
+        ),
+    }
@@ -0,0 +1,117 @@
+from time import perf_counter
+
+import numpy as np
+
+
+class CachedInverseKinematics:
+    """Warm-started inverse kinematics with time budget and result cache.
+
+    Wraps a pinocchio_utils.Kinematics object.  The previous solution is used
+    as initial guess for the next call, iterations stop early once the
+    tolerance is reached or the time budget is used up, and the previous
+    solution is returned directly if it converged and the tip targets did
+    not move by more than cache_epsilon since the last call.  The fingers
+    are iterated in turn, so they share the time budget.
+    """
+
+    def __init__(self, kinematics, tolerance=0.005, max_iterations=100,
+                 time_budget=None, cache_epsilon=1e-4):
+        """
+        Args:
+            kinematics: pinocchio_utils.Kinematics object of the robot.
+            tolerance: Tip position error (in m) at which to stop iterating.
+            max_iterations: Max. number of iterations per finger.
+            time_budget: Max. wall-clock time (in s) of one call or None for
+                no limit.  No iteration is started that is expected to end
+                after it, except the first one of each finger.
+            cache_epsilon: Max. change of any tip target coordinate (in m)
+                for which the cached solution is returned.
+        """
+        self.kinematics = kinematics
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.cache_epsilon = cache_epsilon
+
+        self.cache_hits = 0
+        self.budget_overruns = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the previous solution (e.g. at the start of an episode)."""
+
+        self._last_targets = None
+        self._last_solution = None
+        self._last_errors = None
+        self._last_converged = False
+
+    def inverse_kinematics(self, tip_target_positions, joint_angles_guess):
+        """Inverse kinematics for the whole manipulator.
+
+        Same interface as Kinematics.inverse_kinematics.  The given guess is
+        only used if there is no previous solution to start from.
+
+        Returns:
+            First element is the joint configuration, second element is a list
+            of (x,y,z)-errors of the tip positions.
+        """
+
+        targets = np.asarray(tip_target_positions, dtype=float)
+        if (
+            self._last_converged
+            and np.max(np.abs(targets - self._last_targets))
+            < self.cache_epsilon
+        ):
+            self.cache_hits += 1
+            return self._last_solution, self._last_errors
+
+        if self._last_solution is not None:
+            q = self._last_solution
+        else:
+            q = np.asarray(joint_angles_guess, dtype=float)
+
+        start = perf_counter()
+        if self.time_budget is not None:
+            deadline = start + self.time_budget
+        else:
+            deadline = None
+
+        # iterate the fingers in turn, so they share the time budget
+        tip_link_ids = self.kinematics.tip_link_ids
+        errors = [None] * len(tip_link_ids)
+        active = list(range(len(tip_link_ids)))
+        step_duration = 0.
+        overrun = False
+        for iteration in range(self.max_iterations):
+            for i in list(active):
+                # do not start an iteration that would exceed the budget
+                # (but every finger does the first one)
+                now = perf_counter()
+                if (
+                    iteration > 0
+                    and deadline is not None
+                    and now + step_duration > deadline
+                ):
+                    overrun = True
+                    break
+                q, errors[i] = self.kinematics._inverse_kinematics_step(
+                    tip_link_ids[i], targets[i], q
+                )
+                step_duration = max(step_duration, perf_counter() - now)
+                if np.linalg.norm(errors[i]) < self.tolerance:
+                    active.remove(i)
+            if overrun or not active:
+                break
+        self.budget_overruns += overrun
+
+        # copy, the caller may reuse its target buffer
+        if self._last_targets is None:
+            self._last_targets = targets.copy()
+        else:
+            np.copyto(self._last_targets, targets)
+        self._last_solution = q
+        self._last_errors = errors
+        # only reuse converged solutions, otherwise continue iterating from
+        # the last solution in the next call
+        self._last_converged = not active
+        return q, errors
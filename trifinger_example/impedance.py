@@ -0,0 +1,99 @@
+import numpy as np
+import pinocchio
+
+from trifinger_simulation import trifingerpro_limits
+
+
+class ImpedanceController:
+    """Tip-space impedance controller with gravity compensation.
+
+    Computes joint torques that pull each finger tip towards its target like
+    a damped spring::
+
+        torque = J^T (stiffness * (target - tip) - damping * J dq) + g(q)
+
+    with the tip Jacobian J and the generalized gravity g of the pinocchio
+    model.  In contrast to iterative inverse kinematics, the cost of a step
+    is a fixed number of pinocchio calls, independent of how far the targets
+    are.
+    """
+
+    def __init__(self, kinematics, stiffness=200., damping=5.,
+                 gravity_compensation=True):
+        """
+        Args:
+            kinematics: pinocchio_utils.Kinematics object of the robot.
+            stiffness: Stiffness of the tip springs (in N/m).
+            damping: Damping of the tip velocities (in Ns/m).
+            gravity_compensation: Add the torques compensating gravity.
+        """
+        self.kinematics = kinematics
+        self.stiffness = stiffness
+        self.damping = damping
+        self.gravity_compensation = gravity_compensation
+        self.torque_limit = trifingerpro_limits.robot_torque.high
+
+        self._jacobians = np.zeros((3, 3, 9))
+        self._tip_positions = np.zeros((3, 3))
+        self._force = np.zeros(3)
+        self._torque = np.zeros(9)
+
+    def update(self, joint_positions):
+        """Compute tip positions and Jacobians for the joint positions.
+
+        Returns:
+            Tuple of the tip positions (3, 3) and the linear tip Jacobians in
+            the world frame (3, 3, 9).  Both are reused in the next call.
+        """
+
+        model = self.kinematics.robot_model
+        data = self.kinematics.data
+        pinocchio.computeJointJacobians(model, data, joint_positions)
+        pinocchio.framesForwardKinematics(model, data, joint_positions)
+        for i, frame_id in enumerate(self.kinematics.tip_link_ids):
+            self._tip_positions[i] = data.oMf[frame_id].translation
+            self._jacobians[i] = pinocchio.getFrameJacobian(
+                model,
+                data,
+                frame_id,
+                pinocchio.ReferenceFrame.LOCAL_WORLD_ALIGNED,
+            )[:3]
+        return self._tip_positions, self._jacobians
+
+    def compute_torque(self, tip_target_positions, joint_positions,
+                       joint_velocities):
+        """Compute joint torques pulling the tips towards their targets.
+
+        Uses the Jacobians of the last update() call, which has to be done
+        with the same joint positions.
+
+        Args:
+            tip_target_positions: Target positions of the tips (3, 3).
+            joint_positions: Joint positions (9,).
+            joint_velocities: Joint velocities (9,).
+
+        Returns:
+            Joint torques (9,), clipped to the torque limits.  The array is
+            reused in the next call.
+        """
+
+        torque = self._torque
+        torque.fill(0.)
+        for i in range(3):
+            jacobian = self._jacobians[i]
+            force = self._force
+            np.subtract(tip_target_positions[i], self._tip_positions[i],
+                        out=force)
+            force *= self.stiffness
+            force -= self.damping * (jacobian @ joint_velocities)
+            torque += force @ jacobian
+
+        if self.gravity_compensation:
+            torque += pinocchio.computeGeneralizedGravity(
+                self.kinematics.robot_model,
+                self.kinematics.data,
+                joint_positions,
+            )
+
+        np.clip(torque, -self.torque_limit, self.torque_limit, out=torque)
+        return torque
@@ -0,0 +1,218 @@
+"""Columnar, memory-mapped store of the robot and object data of a job log.
+
+The robot and camera logs of a job (robot_data.dat and camera_data.dat) can
+only be read through robot_fingers, one time index at a time.  export_log()
+converts them once into a directory with one .npy file per column, which
+LogStore then loads lazily and memory-mapped with plain NumPy::
+
+    store = LogStore("/path/to/job/columns")
+    position = store.robot_column("position")[store.robot_row(t)]
+    object_position = store.object_pose_at(t).position
+
+Layout of the directory:
+
+- index.json:  Time index range and list of columns.
+- robot/<name>.npy:  One row per robot time index.
+- camera/<name>.npy:  One row per camera frame (~10 Hz).  Column t holds
+  the first robot time index at which the frame was seen (accurate to the
+  camera_step of export_log()).
+"""
+import json
+import os
+
+import numpy as np
+
+from .utils import ObjectPose
+
+
+INDEX_FILE = "index.json"
+
+# name -> shape of one row
+ROBOT_COLUMNS = {
+    "t": (),
+    "timestamp_ms": (),
+    "position": (9,),
+    "velocity": (9,),
+    "torque": (9,),
+    "tip_force": (3,),
+    "desired_position": (9,),
+    "desired_torque": (9,),
+    "applied_torque": (9,),
+}
+CAMERA_COLUMNS = {
+    "t": (),
+    "timestamp": (),
+    "object_position": (3,),
+    "object_orientation": (4,),
+    "object_confidence": (),
+    "filtered_object_position": (3,),
+    "filtered_object_orientation": (4,),
+    "filtered_object_confidence": (),
+}
+
+def _column_dtype(name):
+    return np.int64 if name == "t" else np.float64
+
+
+def export_log(robot_log, camera_log, output_dir, camera_step=10):
+    """Convert robot and camera log of a job to a LogStore directory.
+
+    Requires robot_fingers (i.e. has to run in the challenge image).
+
+    Args:
+        robot_log: Path to robot_data.dat.
+        camera_log: Path to camera_data.dat.
+        output_dir: Directory to which the columns are written.
+        camera_step: Number of robot steps between two reads of the camera
+            observation.  Has to be below the camera period (100 steps) so no
+            frame is missed.
+
+    Returns:
+        LogStore of the exported data.
+    """
+
+    # import here, so the store can be read without robot_fingers
+    import robot_fingers
+
+    log = robot_fingers.TriFingerPlatformWithObjectLog(
+        str(robot_log), str(camera_log)
+    )
+    first_t = log.get_first_timeindex()
+    last_t = log.get_last_timeindex()
+    n = last_t - first_t + 1
+
+    os.makedirs(os.path.join(output_dir, "robot"), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, "camera"), exist_ok=True)
+
+    # robot columns are written directly to memory-mapped files
+    robot = {
+        name: np.lib.format.open_memmap(
+            os.path.join(output_dir, "robot", name + ".npy"),
+            mode="w+",
+            dtype=_column_dtype(name),
+            shape=(n,) + shape,
+        )
+        for name, shape in ROBOT_COLUMNS.items()
+    }
+    camera = {name: [] for name in CAMERA_COLUMNS}
+    last_camera_timestamp = None
+
+    for i, t in enumerate(range(first_t, last_t + 1)):
+        observation = log.get_robot_observation(t)
+        desired_action = log.get_desired_action(t)
+        applied_action = log.get_applied_action(t)
+        robot["t"][i] = t
+        robot["timestamp_ms"][i] = log.get_timestamp_ms(t)
+        robot["position"][i] = observation.position
+        robot["velocity"][i] = observation.velocity
+        robot["torque"][i] = observation.torque
+        robot["tip_force"][i] = observation.tip_force
+        robot["desired_position"][i] = desired_action.position
+        robot["desired_torque"][i] = desired_action.torque
+        robot["applied_torque"][i] = applied_action.torque
+
+        if i % camera_step != 0:
+            continue
+        camera_observation = log.get_camera_observation(t)
+        timestamp = camera_observation.cameras[0].timestamp
+        if timestamp == last_camera_timestamp:
+            continue
+        last_camera_timestamp = timestamp
+
+        pose = camera_observation.object_pose
+        filtered_pose = camera_observation.filtered_object_pose
+        camera["t"].append(t)
+        camera["timestamp"].append(timestamp)
+        camera["object_position"].append(pose.position)
+        camera["object_orientation"].append(pose.orientation)
+        camera["object_confidence"].append(pose.confidence)
+        camera["filtered_object_position"].append(filtered_pose.position)
+        camera["filtered_object_orientation"].append(
+            filtered_pose.orientation
+        )
+        camera["filtered_object_confidence"].append(filtered_pose.confidence)
+
+    for column in robot.values():
+        column.flush()
+    del robot
+
+    for name, values in camera.items():
+        column = np.asarray(values, dtype=_column_dtype(name)).reshape(
+            (-1,) + CAMERA_COLUMNS[name]
+        )
+        np.save(os.path.join(output_dir, "camera", name + ".npy"), column)
+
+    index = {
+        "first_timeindex": first_t,
+        "last_timeindex": last_t,
+        "num_camera_frames": len(camera["t"]),
+        "robot_columns": list(ROBOT_COLUMNS),
+        "camera_columns": list(CAMERA_COLUMNS),
+    }
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=4)
+
+    return LogStore(output_dir)
+
+
+class LogStore:
+    """Read access to a directory written by export_log().
+
+    Columns are only loaded when first accessed and are memory-mapped, so
+    only the pages that are actually used are read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            self.index = json.load(f)
+        self.first_timeindex = self.index["first_timeindex"]
+        self.last_timeindex = self.index["last_timeindex"]
+        self._columns = {}
+
+    def _load(self, table, name):
+        key = (table, name)
+        if key not in self._columns:
+            self._columns[key] = np.load(
+                os.path.join(self.path, table, name + ".npy"), mmap_mode="r"
+            )
+        return self._columns[key]
+
+    def robot_column(self, name):
+        """Get robot column (one row per time index)."""
+
+        return self._load("robot", name)
+
+    def camera_column(self, name):
+        """Get camera column (one row per camera frame)."""
+
+        return self._load("camera", name)
+
+    def robot_row(self, t):
+        """Get row of the robot columns for time index t."""
+
+        if not self.first_timeindex <= t <= self.last_timeindex:
+            raise IndexError("Time index {} is not in the log.".format(t))
+        return t - self.first_timeindex
+
+    def camera_row(self, t):
+        """Get row of the camera frame that is the latest one at index t.
+
+        Also works on arrays of time indices.
+        """
+
+        row = np.searchsorted(self.camera_column("t"), t, side="right") - 1
+        if np.any(row < 0):
+            raise IndexError("No camera frame before time index {}.".format(t))
+        return row
+
+    def object_pose_at(self, t, filtered=True):
+        """Get the latest object pose at time index t."""
+
+        prefix = "filtered_object_" if filtered else "object_"
+        row = self.camera_row(t)
+        return ObjectPose(
+            self.camera_column(prefix + "position")[row],
+            self.camera_column(prefix + "orientation")[row],
+            self.camera_column(prefix + "confidence")[row],
+        )
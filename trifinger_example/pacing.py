@@ -0,0 +1,60 @@
+from time import perf_counter, sleep
+
+
+class Pacer:
+    """Paces a loop to a fixed period using absolute deadlines.
+
+    Deadlines are computed as multiples of the period on the monotonic
+    perf_counter() clock, so sleep inaccuracies do not accumulate into drift
+    and wall-clock adjustments have no effect.  After a step that took too
+    long, the following steps run without sleeping until the schedule is
+    caught up again (but the loop falls back by at most max_lag).  Steps that
+    reach the pacer after their deadline are counted as late.
+    """
+
+    def __init__(self, period=0.001, real_time_factor=1., max_lag=0.1):
+        """
+        Args:
+            period: Duration (in s) of one step in real time.
+            real_time_factor: Speed relative to real time (e.g. 2 for twice
+                as fast as real time) or None to run as fast as possible.
+            max_lag: Max. time (in s) the loop may fall behind the schedule.
+                If it falls further behind, the schedule is restarted from
+                the current time instead of catching up.
+        """
+        if real_time_factor is not None and not real_time_factor > 0:
+            raise ValueError(
+                "real_time_factor has to be positive, got {}".format(
+                    real_time_factor
+                )
+            )
+        self.period = period
+        self.real_time_factor = real_time_factor
+        self.max_lag = max_lag
+        self.reset()
+
+    def reset(self):
+        """Restart the schedule with the next call of wait()."""
+
+        self.steps = 0
+        self.late_steps = 0
+        self._deadline = None
+
+    def wait(self):
+        """Wait until the end of the current step."""
+
+        self.steps += 1
+        if self.real_time_factor is None:
+            return
+
+        step_duration = self.period / self.real_time_factor
+        now = perf_counter()
+        if self._deadline is None:
+            self._deadline = now
+        elif now > self._deadline:
+            self.late_steps += 1
+            if now - self._deadline > self.max_lag:
+                self._deadline = now
+        else:
+            sleep(self._deadline - now)
+        self._deadline += step_duration
@@ -0,0 +1,480 @@
+"""Pipelined submission of jobs to the robot cluster.
+
+Does the same as scripts/submit_and_download.sh (submit, wait until the job
+is finished, download the data, render a video), but overlaps the stages of
+different jobs: the next job is submitted as soon as the previous one is
+finished on the cluster, while the data of earlier jobs is downloaded and
+rendered by local workers.
+
+By default only one job is on the cluster at a time (max_running=1), like
+in the shell script.  The cluster runs the jobs of a user one after another,
+so submitting more at once would not finish them sooner, but would only
+make the queued ones run into the start timeout.  Use a higher max_running
+for a cluster (or LocalBackend) that runs jobs in parallel.
+
+Each job goes through the states::
+
+    submitted -> running -> finished -> downloaded -> done
+
+or ends in "failed" (if the job did not start or finish on the cluster in
+time).  The states are stored in a JSON file after every change, so an
+interrupted pipeline continues where it stopped when it is started again
+(downloads are resumed, see trifinger_example.download).  Jobs whose
+download or rendering failed are retried the same way.
+
+All requests that ask the cluster for something (submitting and polling)
+go through one PollScheduler, which keeps them at least poll_interval
+apart.  Downloads are not limited.
+
+The cluster is accessed through a backend, ClusterBackend for the real
+cluster and LocalBackend for a fake cluster that runs jobs as local
+processes.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .download import BASE_URL, JOB_FILES, Downloader, HTTPClient, download_jobs
+
+
+HOST = "robots.real-robot-challenge.com"
+
+STATE_FILE = "pipeline_state.json"
+
+SUBMITTED = "submitted"
+RUNNING = "running"
+FINISHED = "finished"
+DOWNLOADED = "downloaded"
+DONE = "done"
+FAILED = "failed"
+
+
+class SubmissionError(Exception):
+    pass
+
+
+class ClusterBackend:
+    """Submits via ssh and checks/downloads the data via HTTPS."""
+
+    def __init__(self, username, password, host=HOST, base_url=BASE_URL,
+                 download_workers=8):
+        """
+        Args:
+            username: User name on the cluster.
+            password: Password of the user.
+            host: Host to which the submit command is sent via ssh.
+            base_url: URL of the data directory, {username} is replaced.
+            download_workers: Number of parallel transfers per download.
+        """
+        self.username = username
+        self.host = host
+        url = base_url.format(username=username)
+        self.client = HTTPClient(url, username, password)
+        # the backend output is in the parent of the data directory
+        self.output_client = HTTPClient(
+            url.rstrip("/").rsplit("/", 1)[0], username, password
+        )
+        self.downloader = Downloader(self.client, workers=download_workers)
+
+    def submit(self):
+        """Submit a job and return its ID."""
+
+        result = subprocess.run(
+            ["ssh", "-T", "{}@{}".format(self.username, self.host)],
+            input="submit",
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        match = re.search(
+            r"job\(s\) submitted to cluster (\d+)", result.stdout
+        )
+        if match is None:
+            raise SubmissionError(
+                "Failed to submit job.  Output:\n" + result.stdout
+            )
+        return match.group(1)
+
+    def is_started(self, job_id):
+        return self.client.exists(job_id)
+
+    def is_finished(self, job_id):
+        # report.json is generated last of all files
+        return self.client.exists("{}/report.json".format(job_id))
+
+    def download(self, job_id, output_dir):
+        download_jobs(self.downloader, [job_id], output_dir)
+
+    def download_backend_output(self, job_dir):
+        for name in ("stdout.txt", "stderr.txt"):
+            with open(os.path.join(job_dir, name), "wb") as f:
+                f.write(self.output_client.get(name))
+
+
+class LocalBackend:
+    """Fake cluster that runs each job as a local process.
+
+    A job runs ``command + [<data_dir>/<job_id>]``, which is expected to
+    write the files of the job to that directory.  Once the process exited,
+    report.json is written (with backend_error set if the exit code is not
+    zero) and its output is stored as <data_dir>/stdout.txt and
+    stderr.txt, like the backend output of the cluster.
+    """
+
+    def __init__(self, data_dir, command):
+        """
+        Args:
+            data_dir: Directory of the job data.
+            command: Command (list of arguments) that runs a job.
+        """
+        self.data_dir = data_dir
+        self.command = command
+        os.makedirs(data_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _next_job_id(self):
+        ids = [int(name) for name in os.listdir(self.data_dir)
+               if name.isdigit()]
+        return str(max(ids, default=0) + 1)
+
+    def _run(self, job_dir):
+        with open(os.path.join(self.data_dir, "stdout.txt"), "w") as stdout, \
+                open(os.path.join(self.data_dir, "stderr.txt"), "w") as stderr:
+            returncode = subprocess.call(
+                self.command + [job_dir], stdout=stdout, stderr=stderr
+            )
+        report = {"backend_error": returncode != 0}
+        with open(os.path.join(job_dir, "report.json.tmp"), "w") as f:
+            json.dump(report, f, indent=4)
+        os.replace(
+            os.path.join(job_dir, "report.json.tmp"),
+            os.path.join(job_dir, "report.json"),
+        )
+
+    def submit(self):
+        with self._lock:
+            job_id = self._next_job_id()
+            job_dir = os.path.join(self.data_dir, job_id)
+            os.makedirs(job_dir)
+        threading.Thread(target=self._run, args=(job_dir,), daemon=True).start()
+        return job_id
+
+    def is_started(self, job_id):
+        return os.path.isdir(os.path.join(self.data_dir, job_id))
+
+    def is_finished(self, job_id):
+        return os.path.exists(
+            os.path.join(self.data_dir, job_id, "report.json")
+        )
+
+    def download(self, job_id, output_dir):
+        job_dir = os.path.join(output_dir, job_id)
+        for name in JOB_FILES:
+            source = os.path.join(self.data_dir, job_id, name)
+            if os.path.exists(source):
+                os.makedirs(
+                    os.path.dirname(os.path.join(job_dir, name)), exist_ok=True
+                )
+                shutil.copy(source, os.path.join(job_dir, name))
+
+    def download_backend_output(self, job_dir):
+        for name in ("stdout.txt", "stderr.txt"):
+            shutil.copy(os.path.join(self.data_dir, name), job_dir)
+
+
+class VideoRenderer:
+    """Renders the video of a job with the log viewer in an apptainer image."""
+
+    def __init__(self, image, viewer, camera="camera60", workers=None):
+        """
+        Args:
+            image: Path to the apptainer image (video_creation_image.sif).
+            viewer: Path to scripts/trifinger_platform_log_viewer_V2.py of
+                this repository (it is not installed with the package).
+            camera: Camera of the video.
+            workers: Number of worker threads of the viewer (default: number
+                of CPUs).
+        """
+        self.image = image
+        self.viewer = os.path.abspath(viewer)
+        self.camera = camera
+        self.workers = workers or os.cpu_count()
+
+    def __call__(self, job_dir):
+        subprocess.run(
+            [
+                "apptainer", "run", self.image, "python3", self.viewer,
+                os.path.join(job_dir, "robot_data.dat"),
+                os.path.join(job_dir, "camera_data.dat"),
+                "-g", os.path.join(job_dir, "user", "goals.json"),
+                "--camera", self.camera,
+                "--save-video", os.path.join(job_dir, "video.avi"),
+                "--workers", str(self.workers),
+            ],
+            check=True,
+        )
+
+
+class PollScheduler:
+    """Keeps the requests to the cluster at least min_interval apart."""
+
+    def __init__(self, min_interval=60., last_time=None):
+        """
+        Args:
+            min_interval: Min. time (in s) between two requests.
+            last_time: Time (time.time()) of the last request, e.g. of a
+                previous run.
+        """
+        self.min_interval = min_interval
+        self.last_time = last_time
+
+    def time_until_ready(self):
+        if self.last_time is None:
+            return 0.
+        return max(self.last_time + self.min_interval - time.time(), 0.)
+
+    def acquire(self):
+        """Take the slot if a request is allowed now.
+
+        Returns:
+            True if the caller may send a request.
+        """
+
+        if self.time_until_ready() > 0.:
+            return False
+        self.last_time = time.time()
+        return True
+
+
+class JobStore:
+    """Jobs of the pipeline, stored in a JSON file after every change.
+
+    Jobs are updated by the worker threads, so changes are serialized by a
+    lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.jobs = {}
+        self.last_poll_time = None
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            self.jobs = state["jobs"]
+            self.last_poll_time = state["last_poll_time"]
+
+    def save(self):
+        with self._lock:
+            state = {"jobs": self.jobs, "last_poll_time": self.last_poll_time}
+            # write to temporary file first, so an interrupted run does not
+            # leave a broken state
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(state, f, indent=4)
+            os.replace(self.path + ".tmp", self.path)
+
+    def add(self, job_id):
+        with self._lock:
+            self.jobs[job_id] = {
+                "state": SUBMITTED,
+                "submit_time": time.time(),
+                "start_time": None,
+                "backend_error": False,
+                "error": None,
+            }
+            self.save()
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+            self.save()
+
+    def in_state(self, *states):
+        with self._lock:
+            return [job_id for job_id, job in self.jobs.items()
+                    if job["state"] in states]
+
+
+class Pipeline:
+    """Submits jobs and downloads/renders them while the next ones run."""
+
+    def __init__(self, backend, output_dir, num_jobs, render=None,
+                 workers=2, poll_interval=60., max_running=1,
+                 start_timeout=30 * 60., run_timeout=15 * 60.):
+        """
+        Args:
+            backend: Backend of the cluster (see ClusterBackend).
+            output_dir: Directory of the downloaded data (one sub-directory
+                per job) and the state file.
+            num_jobs: Total number of jobs to submit (including the ones of
+                previous runs with the same output_dir).
+            render: Function render(job_dir) called after the download, e.g.
+                a VideoRenderer.  None to only download.
+            workers: Number of jobs downloaded/rendered in parallel.
+            poll_interval: Min. time (in s) between two requests to the
+                cluster.  Do not go below 60!
+            max_running: Max. number of jobs on the cluster at once (see
+                module docstring for why this is 1 by default).
+            start_timeout: Time (in s) after which a submitted job that did
+                not start is given up.
+            run_timeout: Time (in s) after which a started job that did not
+                finish is given up.
+        """
+        self.backend = backend
+        self.output_dir = output_dir
+        self.num_jobs = num_jobs
+        self.render = render
+        self.workers = workers
+        self.max_running = max_running
+        self.start_timeout = start_timeout
+        self.run_timeout = run_timeout
+
+        self.store = JobStore(os.path.join(output_dir, STATE_FILE))
+        self.scheduler = PollScheduler(
+            poll_interval, self.store.last_poll_time
+        )
+        # stop submitting after a job failed on the cluster
+        self.stopped = False
+        # jobs whose download/rendering failed in this run
+        self._deferred = set()
+        self._next_poll = 0
+
+    def _log(self, job_id, message):
+        print("[{}] job {}: {}".format(time.strftime("%H:%M:%S"), job_id,
+                                       message))
+
+    def _request_slot(self):
+        if not self.scheduler.acquire():
+            return False
+        self.store.last_poll_time = self.scheduler.last_time
+        self.store.save()
+        return True
+
+    def _fail(self, job_id, error, stop=False):
+        self._log(job_id, "failed: {}".format(error))
+        self.store.update(job_id, state=FAILED, error=str(error))
+        if stop:
+            self.stopped = True
+
+    def _submit(self):
+        try:
+            job_id = self.backend.submit()
+        except SubmissionError as e:
+            print(e)
+            self.stopped = True
+            return
+        self.store.add(job_id)
+        self._log(job_id, "submitted")
+
+    def _poll(self, job_id):
+        """Check the status of a job on the cluster."""
+
+        job = self.store.jobs[job_id]
+        now = time.time()
+        if job["state"] == SUBMITTED:
+            if self.backend.is_started(job_id):
+                self.store.update(job_id, state=RUNNING, start_time=now)
+                self._log(job_id, "running")
+            elif now - job["submit_time"] > self.start_timeout:
+                self._fail(job_id, "job did not start", stop=True)
+        else:
+            if self.backend.is_finished(job_id):
+                self.store.update(job_id, state=FINISHED)
+                self._log(job_id, "finished")
+            elif now - job["start_time"] > self.run_timeout:
+                self._fail(job_id, "job did not finish in time", stop=True)
+
+    def _download(self, job_id):
+        job_dir = os.path.join(self.output_dir, job_id)
+        self.backend.download(job_id, self.output_dir)
+        with open(os.path.join(job_dir, "report.json"), "r") as f:
+            report = json.load(f)
+        # like the shell script, any true flag (i.e. backend_error) counts
+        # as failure of the backend
+        backend_error = any(value is True for value in report.values())
+        if backend_error:
+            self.backend.download_backend_output(job_dir)
+        return backend_error
+
+    def _process(self, job_id):
+        """Download and render a finished job (run by a worker)."""
+
+        job_dir = os.path.join(self.output_dir, job_id)
+        if self.store.jobs[job_id]["state"] == FINISHED:
+            backend_error = self._download(job_id)
+            self.store.update(
+                job_id, state=DOWNLOADED, backend_error=backend_error
+            )
+            if backend_error:
+                self._log(job_id, "ERROR: backend failed, see stdout.txt "
+                          "and stderr.txt in {}".format(job_dir))
+            else:
+                self._log(job_id, "downloaded")
+        if self.render is not None and not self.store.jobs[job_id][
+                "backend_error"]:
+            self.render(job_dir)
+            self._log(job_id, "rendered")
+        self.store.update(job_id, state=DONE)
+
+    def _process_failed(self, job_id, error):
+        # e.g. a broken connection, the download is resumed (or the video
+        # rendered) in the next run, only backend failures are final
+        self._deferred.add(job_id)
+        self._log(job_id, "{}: {} (retried in the next run)".format(
+            type(error).__name__, error
+        ))
+
+    def _can_submit(self):
+        return (
+            not self.stopped
+            and len(self.store.jobs) < self.num_jobs
+            and len(self.store.in_state(SUBMITTED, RUNNING)) < self.max_running
+        )
+
+    def run(self):
+        """Run until all jobs are done or failed.
+
+        Jobs whose download or rendering raised an error are left in their
+        state (finished or downloaded) and retried in the next run.
+
+        Returns:
+            Dictionary mapping the job IDs to their state.
+        """
+
+        processing = {}
+        with ThreadPoolExecutor(self.workers) as executor:
+            while True:
+                for job_id, future in list(processing.items()):
+                    if future.done():
+                        del processing[job_id]
+                        if future.exception() is not None:
+                            self._process_failed(job_id, future.exception())
+
+                for job_id in self.store.in_state(FINISHED, DOWNLOADED):
+                    if job_id not in processing and job_id not in self._deferred:
+                        processing[job_id] = executor.submit(
+                            self._process, job_id
+                        )
+
+                active = self.store.in_state(SUBMITTED, RUNNING)
+                if not active and not processing and not self._can_submit():
+                    break
+
+                # one request per slot, submitting a new job has priority,
+                # the active jobs are polled in turn
+                if (self._can_submit() or active) and self._request_slot():
+                    if self._can_submit():
+                        self._submit()
+                    else:
+                        self._next_poll %= len(active)
+                        self._poll(active[self._next_poll])
+                        self._next_poll += 1
+
+                time.sleep(min(max(self.scheduler.time_until_ready(), 0.1), 1.))
+
+        return {job_id: job["state"] for job_id, job in self.store.jobs.items()}
@@ -0,0 +1,99 @@
+import numpy as np
+
+from .utils import ObjectPose
+
+
+class ObjectPoseFilter:
+    """Predicts the cube position at robot rate from delayed camera poses.
+
+    The camera poses arrive at ~10 Hz and are already old when they arrive
+    (their timestamp is the capture time).  The filter fuses them with a
+    constant-velocity model (alpha-beta filter, with the gains scaled by
+    the confidence of the pose) and extrapolates the position to the
+    current time.  New camera poses are only processed when their timestamp
+    changes, so in between a step only costs the extrapolation.
+
+    The orientation is the one of the latest confident camera pose.
+    """
+
+    def __init__(self, alpha=0.8, beta=0.3, min_confidence=0.2,
+                 max_speed=0.5, max_horizon=0.3):
+        """
+        Args:
+            alpha: Gain of the position correction (at confidence 1).
+            beta: Gain of the velocity correction (at confidence 1).
+            min_confidence: Camera poses with lower confidence are ignored.
+            max_speed: Max. estimated speed of the cube (in m/s).
+            max_horizon: Max. time (in s) over which the position is
+                extrapolated, beyond that it is held.
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.min_confidence = min_confidence
+        self.max_speed = max_speed
+        self.max_horizon = max_horizon
+
+        self._position = np.zeros(3)
+        self._velocity = np.zeros(3)
+        self._innovation = np.zeros(3)
+        self._predicted = np.zeros(3)
+        self.reset()
+
+    def reset(self):
+        """Forget the estimate (e.g. at the start of an episode)."""
+
+        self._camera_timestamp = None
+        self._estimate_time = None
+        self._orientation = None
+        self._confidence = 0.
+        self._velocity.fill(0.)
+
+    def _update(self, timestamp, pose):
+        confidence = pose.confidence
+        if confidence < self.min_confidence and self._estimate_time is not None:
+            return
+
+        if self._estimate_time is None:
+            self._position[:] = pose.position
+            self._velocity.fill(0.)
+        else:
+            dt = timestamp - self._estimate_time
+            if dt <= 0.:
+                return
+            # predict to the capture time, then correct
+            self._position += dt * self._velocity
+            np.subtract(pose.position, self._position, out=self._innovation)
+            self._position += self.alpha * confidence * self._innovation
+            self._velocity += (
+                self.beta * confidence / dt
+            ) * self._innovation
+            speed = np.sqrt(np.dot(self._velocity, self._velocity))
+            if speed > self.max_speed:
+                self._velocity *= self.max_speed / speed
+
+        self._estimate_time = timestamp
+        self._orientation = pose.orientation
+        self._confidence = confidence
+
+    def filter(self, camera_timestamp, pose, time):
+        """Get the predicted pose at the given time.
+
+        Args:
+            camera_timestamp: Timestamp (in s) of the camera observation.
+            pose: Object pose of the camera observation.
+            time: Current time (in s, same clock as the camera timestamps).
+
+        Returns:
+            ObjectPose with predicted position, latest orientation and the
+            confidence of the latest used camera pose.  The position array
+            is reused in the next call.
+        """
+
+        if camera_timestamp != self._camera_timestamp:
+            self._camera_timestamp = camera_timestamp
+            self._update(camera_timestamp, pose)
+
+        horizon = min(max(time - self._estimate_time, 0.), self.max_horizon)
+        np.multiply(self._velocity, horizon, out=self._predicted)
+        self._predicted += self._position
+        return ObjectPose(self._predicted, self._orientation, self._confidence)
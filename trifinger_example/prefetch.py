@@ -0,0 +1,67 @@
+import threading
+
+
+class ObservationPrefetcher:
+    """Fetches robot and camera observations in a background thread.
+
+    The thread waits on the platform for the next time index and publishes
+    the robot and camera observation of it as one tuple.  Publishing only
+    replaces a reference, which is atomic in CPython, so the control loop can
+    read the latest observations without locking or blocking.
+
+    Only for the real robot: the thread relies on the blocking getters of
+    the robot_interfaces frontend, which release the GIL while waiting.  The
+    simulation is not thread-safe and cannot be waited on.
+    """
+
+    def __init__(self, platform, t):
+        """
+        Args:
+            platform: Platform frontend to fetch the observations from.
+            t: First time index to fetch.
+        """
+        self.platform = platform
+        # (t, robot_observation, camera_observation) of the latest step
+        self._latest = None
+        self._stop = False
+
+        # number of reads that got an older time index than requested
+        self.stale_reads = 0
+
+        self._thread = threading.Thread(
+            target=self._run, args=(t,), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, t):
+        while not self._stop:
+            robot_observation = self.platform.get_robot_observation(t)
+            camera_observation = self.platform.get_camera_observation(t)
+            self._latest = (t, robot_observation, camera_observation)
+            # skip ahead if the control loop is already further
+            t = max(t + 1, self.platform.get_current_timeindex())
+
+    def get(self, t):
+        """Get the latest observations (at time index t or older).
+
+        Only blocks if nothing was fetched yet.
+
+        Returns:
+            Tuple of time index, robot observation and camera observation.
+        """
+
+        latest = self._latest
+        if latest is None:
+            return (
+                t,
+                self.platform.get_robot_observation(t),
+                self.platform.get_camera_observation(t),
+            )
+        if latest[0] < t:
+            self.stale_reads += 1
+        return latest
+
+    def stop(self):
+        """Stop the thread after the step it is currently waiting for."""
+
+        self._stop = True
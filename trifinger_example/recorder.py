@@ -0,0 +1,143 @@
+"""Recording of per-step controller state to memory-mapped files.
+
+Written by EpisodeRecorder, read with load_recording().  Layout of the
+directory:
+
+- index.json:  Columns (with shape and dtype) and number of recorded steps.
+- <name>.npy:  One row per recorded step.  Column t holds the time index of
+  the step and is -1 for rows that were not written (e.g. if the run was
+  aborted before close() was called).
+"""
+import json
+import os
+
+import numpy as np
+
+
+INDEX_FILE = "index.json"
+
+
+class EpisodeRecorder:
+    """Records controller state of every step with a fixed memory footprint.
+
+    Values are written into preallocated ring buffers of chunk_size rows.
+    Whenever a chunk is complete, it is copied into memory-mapped .npy files
+    (one per column) which are sized for the whole episode at construction.
+    So recording a step does not allocate anything and the only I/O in the
+    control loop is a memcpy into the page cache once per chunk.
+
+    Usage::
+
+        recorder.start_step(t)
+        recorder.record("target", target)
+        recorder.end_step()
+        ...
+        recorder.close()
+    """
+
+    def __init__(self, path, columns, num_steps, chunk_size=1000):
+        """
+        Args:
+            path: Directory to which the columns are written.
+            columns: Dictionary mapping column names to (shape of one row,
+                dtype).  A column t with the time index is always added.
+            num_steps: Max. number of steps that are recorded.  Further steps
+                are dropped (and counted in dropped_steps).
+            chunk_size: Number of rows that are copied to the files at once.
+        """
+        self.path = path
+        self.num_steps = num_steps
+        self.chunk_size = chunk_size
+        self.columns = dict(t=((), np.int64), **columns)
+
+        self.steps = 0
+        self.dropped_steps = 0
+        self._flushed = 0
+        self._row = None
+
+        os.makedirs(path, exist_ok=True)
+        self._buffers = {}
+        self._files = {}
+        for name, (shape, dtype) in self.columns.items():
+            self._buffers[name] = np.zeros((chunk_size,) + shape, dtype)
+            self._files[name] = np.lib.format.open_memmap(
+                os.path.join(path, name + ".npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(num_steps,) + shape,
+            )
+        self._files["t"][:] = -1
+        self._write_index()
+
+    def _write_index(self, num_recorded_steps=None):
+        index = {
+            "num_steps": num_recorded_steps,
+            "columns": {
+                name: {"shape": list(shape), "dtype": np.dtype(dtype).str}
+                for name, (shape, dtype) in self.columns.items()
+            },
+        }
+        with open(os.path.join(self.path, INDEX_FILE), "w") as f:
+            json.dump(index, f, indent=4)
+
+    def start_step(self, t):
+        """Start a new row for time index t."""
+
+        if self.steps >= self.num_steps:
+            self._row = None
+            self.dropped_steps += 1
+            return
+        self._row = self.steps - self._flushed
+        self._buffers["t"][self._row] = t
+
+    def record(self, name, value):
+        """Set value of a column in the current row."""
+
+        if self._row is not None:
+            self._buffers[name][self._row] = value
+
+    def end_step(self):
+        """Finish the current row (flushes if the chunk is complete)."""
+
+        if self._row is None:
+            return
+        self._row = None
+        self.steps += 1
+        if self.steps - self._flushed == self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        n = self.steps - self._flushed
+        for name, buffer in self._buffers.items():
+            self._files[name][self._flushed:self.steps] = buffer[:n]
+        self._flushed = self.steps
+
+    def close(self):
+        """Flush remaining rows and write the files to disk."""
+
+        self._flush()
+        for column in self._files.values():
+            column.flush()
+        self._write_index(self.steps)
+
+
+def load_recording(path):
+    """Load a directory written by EpisodeRecorder.
+
+    Returns:
+        Dictionary mapping column names to memory-mapped arrays with one row
+        per recorded step.
+    """
+
+    with open(os.path.join(path, INDEX_FILE), "r") as f:
+        index = json.load(f)
+
+    columns = {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        for name in index["columns"]
+    }
+    num_steps = index["num_steps"]
+    if num_steps is None:
+        # not closed, use all rows that were flushed
+        num_steps = int(np.count_nonzero(columns["t"] >= 0))
+    return {name: column[:num_steps] for name, column in columns.items()}
@@ -0,0 +1,148 @@
+import collections
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+import trifinger_simulation.tasks.move_cube as task
+
+from .ik import CachedInverseKinematics
+from .log_store import LogStore, export_log
+from .robot import get_kinematics
+from .scripts.run_robot import run_episode
+from .timing import StepTimer
+from .utils import ObjectPose
+
+
+RobotObservation = collections.namedtuple(
+    "RobotObservation", ["position", "velocity", "torque"]
+)
+
+
+class RecordedData:
+    """Robot and object observations of a recorded job, held in memory."""
+
+    def __init__(self, store, filtered=True):
+        """
+        Args:
+            store: LogStore with the recorded data.
+            filtered: Use the filtered object pose.
+        """
+        prefix = "filtered_object_" if filtered else "object_"
+        self.position = np.array(store.robot_column("position"))
+        self.velocity = np.array(store.robot_column("velocity"))
+        self.torque = np.array(store.robot_column("torque"))
+        self.camera_timestamp = np.array(store.camera_column("timestamp"))
+        self.object_position = np.array(
+            store.camera_column(prefix + "position")
+        )
+        self.object_orientation = np.array(
+            store.camera_column(prefix + "orientation")
+        )
+        self.object_confidence = np.array(
+            store.camera_column(prefix + "confidence")
+        )
+        # camera frame that is the latest one in each step
+        self.camera_row = store.camera_row(store.robot_column("t"))
+
+    @classmethod
+    def from_log(cls, robot_log, camera_log, filtered=True):
+        """Load data from robot and camera log (requires robot_fingers)."""
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            return cls(
+                export_log(robot_log, camera_log, tmp_dir), filtered=filtered
+            )
+
+    def __len__(self):
+        return len(self.position)
+
+
+class ReplayRobot:
+    """Stand-in for Robot that plays back recorded observations.
+
+    Provides the parts of the Robot interface that the controller uses.
+    Observations come from the recording, independent of the actions, which
+    are stored in preallocated arrays instead of being sent anywhere.  Time
+    index 0 corresponds to the first step of the recording.
+    """
+
+    def __init__(self, data, goal_position, episode_length=None,
+                 ik_time_budget=None):
+        """
+        Args:
+            data: RecordedData to play back.
+            goal_position: Goal position of the cube.
+            episode_length: Number of steps to replay (default: all).
+            ik_time_budget: See Robot.  Defaults to no limit, so the replay
+                is deterministic.
+        """
+        self.data = data
+        if episode_length is None:
+            episode_length = len(data)
+        self.episode_length = min(episode_length, len(data))
+
+        self.goal = task.Pose(
+            position=np.asarray(goal_position, dtype=float),
+            orientation=np.array([0., 0., 0., 1.]),
+        )
+        self.kinematics = get_kinematics()
+        self.ik = CachedInverseKinematics(
+            self.kinematics, max_iterations=100, time_budget=ik_time_budget
+        )
+        self.impedance = None
+        self.pose_filter = None
+        self.pacer = None
+        self.prefetcher = None
+        self.timer = StepTimer(capacity=self.episode_length + 1)
+        self.recorder = None
+        self.diagnostics = None
+
+        # action stream (NaN where no position/torque was given)
+        self.positions = np.full((self.episode_length, 9), np.nan)
+        self.torques = np.full((self.episode_length, 9), np.nan)
+        self._t = 0
+
+    def append_desired_action(self, torque=None, position=None):
+        """Record action and advance to the next step."""
+
+        self.timer.end_step()
+        if position is not None:
+            self.positions[self._t] = position
+        if torque is not None:
+            self.torques[self._t] = torque
+        self._t += 1
+        self.timer.start_step()
+        return self._t
+
+    def get_camera_timestamp(self, t):
+        """Get timestamp of the latest camera observation at time step t."""
+
+        return self.data.camera_timestamp[self.data.camera_row[t]]
+
+    def get_observation(self, t):
+        """Get recorded robot and object observation at time step t."""
+
+        data = self.data
+        row = data.camera_row[t]
+        robot_observation = RobotObservation(
+            data.position[t], data.velocity[t], data.torque[t]
+        )
+        object_observation = ObjectPose(
+            data.object_position[row],
+            data.object_orientation[row],
+            data.object_confidence[row],
+        )
+        return robot_observation, object_observation
+
+
+def replay(robot, scheduler=None):
+    """Run the controller on a ReplayRobot as fast as possible.
+
+    Returns:
+        Number of steps per second.
+    """
+
+    start = perf_counter()
+    steps = run_episode(robot, scheduler)
+    return steps / (perf_counter() - start)
@@ -1,43 +1,176 @@
+import copy
 import json
 import os
-from time import time, sleep
+from time import perf_counter
 
 import numpy as np
+import pybullet
 
 import trifinger_simulation
 from trifinger_simulation import trifingerpro_limits
+from trifinger_simulation.pinocchio_utils import Kinematics
 import trifinger_simulation.tasks.move_cube as task
 import trifinger_simulation.visual_objects
-from trifinger_simulation.pinocchio_utils import Kinematics
 
+from .ik import CachedInverseKinematics
+from .impedance import ImpedanceController
+from .pacing import Pacer
+from .pose_filter import ObjectPoseFilter
+from .prefetch import ObservationPrefetcher
+from .timing import StepTimer
 from .utils import random_yaw_orientation
 
 
+# names of the finger tip frames in the URDF, in the order of the fingers
+TIP_LINK_NAMES = [
+    "finger_tip_link_0",
+    "finger_tip_link_120",
+    "finger_tip_link_240",
+]
+
+
+def get_finger_urdf_path():
+    """Get path to the URDF file of the TriFinger Pro."""
+
+    robot_properties_path = os.path.join(
+        os.path.dirname(trifinger_simulation.__file__), "robot_properties_fingers"
+    )
+    urdf_file = trifinger_simulation.finger_types_data.get_finger_urdf("trifingerpro")
+    return os.path.join(
+        robot_properties_path, "urdf", urdf_file
+    )
+
+
+# kinematics object shared by everything in the process, see get_kinematics
+_kinematics = None
+
+
+def get_kinematics():
+    """Get kinematics object of the TriFinger Pro.
+
+    The URDF is only parsed once per process.  Call this before starting
+    worker processes, so that forked workers inherit the model.
+    """
+
+    global _kinematics
+    if _kinematics is None:
+        _kinematics = Kinematics(get_finger_urdf_path(), TIP_LINK_NAMES)
+    return _kinematics
+
+
 class Robot:
     """Implements interactions with robot (simulated or real)."""
 
-    def __init__(self, simulate, episode_length=10000):
+    def __init__(self, simulate, episode_length=10000, difficulty=1,
+                 visualization=True,
+                 real_time_factor=1., ik_time_budget=None,
+                 prefetch_observations=False, ik_max_iterations=100,
+                 control_mode="position", filter_object_pose=False):
+        """
+        Args:
+            simulate: Run in simulation instead of on the real robot.
+            episode_length: Episode length in robot steps.
+            difficulty: Difficulty level of the goal (see
+                move_cube.sample_goal).
+            visualization: Show the pybullet GUI (only used in simulation).
+            real_time_factor: Speed of the simulation relative to real time
+                (e.g. 2 for twice as fast as real time) or None to run as fast
+                as possible (only used in simulation).
+            ik_time_budget: Time budget (in s) of one inverse kinematics
+                call or None to only limit the number of iterations.  A budget
+                makes the results depend on the load of the machine.
+            prefetch_observations: Fetch observations in a background thread
+                (only supported on the real robot), see
+                ObservationPrefetcher.
+            ik_max_iterations: Max. number of inverse kinematics iterations
+                per finger.
+            control_mode: "position" to control joint positions from inverse
+                kinematics or "torque" to control joint torques with an
+                ImpedanceController.
+            filter_object_pose: Return the object pose predicted by an
+                ObjectPoseFilter for the current time step instead of the
+                latest camera pose.
+        """
+        if control_mode not in ("position", "torque"):
+            raise ValueError("Unknown control mode '{}'.".format(control_mode))
+        if simulate and prefetch_observations:
+            raise ValueError(
+                "Observation prefetching is only supported on the real robot."
+            )
+
         self.simulate = simulate
         self.episode_length = episode_length
+        self.difficulty = difficulty
+        self.visualization = visualization
 
         # sample random goal pose for the cube
-        self.goal = task.sample_goal(difficulty=1)
+        self.goal = task.sample_goal(difficulty=difficulty)
         if not simulate:
             self._save_goal()
 
+        # durations of the initialization phases (for the startup report)
+        self.startup_timings = {}
+
         # get robot platform object (simulated or real)
+        start = perf_counter()
         if simulate:
             self.platform = self._get_platform_sim(self.goal)
         else:
             self.platform = self._get_platform_real()
+        self.startup_timings["platform"] = perf_counter() - start
 
+        # action object and its buffers are reused in every step (the
+        # platforms copy the action when it is appended)
+        self._position = np.full(9, np.nan)
+        self._torque = np.zeros(9)
+        self._action = self.platform.Action(
+            torque=self._torque, position=self._position
+        )
+
+        start = perf_counter()
         self.kinematics = self._get_kinematics()
-        self.time_of_last_step = None
+        self.startup_timings["kinematics"] = perf_counter() - start
+        self.ik = CachedInverseKinematics(
+            self.kinematics,
+            max_iterations=ik_max_iterations,
+            time_budget=ik_time_budget,
+        )
+        if control_mode == "torque":
+            self.impedance = ImpedanceController(self.kinematics)
+        else:
+            self.impedance = None
+        # avoid simulator running faster than requested (the real robot is
+        # paced by its backend)
+        if simulate:
+            self.pacer = Pacer(period=0.001, real_time_factor=real_time_factor)
+        else:
+            self.pacer = None
+        # per-phase timings of the control loop
+        self.timer = StepTimer(capacity=episode_length + 1)
+        if filter_object_pose:
+            self.pose_filter = ObjectPoseFilter()
+        else:
+            self.pose_filter = None
+        # camera observation of the current step (see
+        # _get_camera_observation)
+        self._camera_observation = None
+        self._camera_observation_t = None
+        # optional EpisodeRecorder for controller state and DiagnosticLog
+        # (set by the caller)
+        self.recorder = None
+        self.diagnostics = None
 
         # already do one step here to be able to get observation
-        self.append_desired_action(
+        start = perf_counter()
+        t = self.append_desired_action(
             position=trifingerpro_limits.robot_position.default
         )
+        self.startup_timings["first_step"] = perf_counter() - start
+
+        if prefetch_observations:
+            self.prefetcher = ObservationPrefetcher(self.platform, t)
+        else:
+            self.prefetcher = None
 
 
     def _save_goal(self):
@@ -45,7 +178,7 @@ class Robot:
 
         goals_path = "/output/goals.json"
         goals_dict = {
-            "difficulty": 1,
+            "difficulty": self.difficulty,
             "goal": [{
                     "position": self.goal.position.tolist(),
                     "orientation": self.goal.orientation.tolist(),
@@ -57,6 +190,58 @@ class Robot:
         with open(goals_path, "w") as f:
             json.dump(goals_dict, f, indent=4)
 
+    def save_timings(self, path="/output/timings.json"):
+        """Save summary of the control loop timings to file."""
+
+        self.timer.save(path, extra={"startup": self.startup_timings})
+
+    def reset(self, goal=None, initial_object_pose=None):
+        """Start a new episode in simulation, reusing the platform.
+
+        Instead of creating a new TriFingerPlatform, the simulator state
+        saved after its creation is restored and cube and goal marker are
+        moved to their new pose (the first episode is started the same way).
+        The inverse kinematics, the pose filter and the timer are reset as
+        well.  Goal and cube pose are sampled like in the constructor if not
+        given (in the same order), so with the same seeds of np.random and
+        move_cube and without IK time budget, the episode is the same as the
+        one of a new Robot, independent of the previous episodes.
+
+        Args:
+            goal: Goal pose of the cube.
+            initial_object_pose: Initial pose of the cube.
+        """
+
+        if not self.simulate:
+            raise RuntimeError("Reset is only supported in simulation.")
+
+        if goal is None:
+            goal = task.sample_goal(difficulty=self.difficulty)
+        if initial_object_pose is None:
+            initial_object_pose = self._sample_initial_object_pose()
+        self.goal = goal
+        self._restore_platform_sim(self.platform, initial_object_pose)
+
+        self.ik.reset()
+        if self.pose_filter is not None:
+            self.pose_filter.reset()
+        self._camera_observation = None
+        self._camera_observation_t = None
+        self.timer = StepTimer(capacity=self.episode_length + 1)
+        self.append_desired_action(
+            position=trifingerpro_limits.robot_position.default
+        )
+
+    def _sample_initial_object_pose(self):
+        """Cube in the middle of the arena with random orientation."""
+
+        position = np.array((0., 0., task._CUBE_WIDTH / 2))
+        orientation = random_yaw_orientation()
+        return task.Pose(
+            position=position,
+            orientation=orientation
+        )
+
     def _get_platform_sim(self, goal):
         """Initialize simulation."""
         
@@ -64,29 +249,67 @@ class Robot:
 
         # initial position of cube in the middle of the arena
         # with random orientation
-        position = np.array((0., 0., task._CUBE_WIDTH / 2))
-        orientation = random_yaw_orientation()
-        initial_object_pose = task.Pose(
-            position=position,
-            orientation=orientation
-        )
+        initial_object_pose = self._sample_initial_object_pose()
 
         platform = trifinger_simulation.TriFingerPlatform(
-            visualization=True,
+            visualization=self.visualization,
             initial_robot_position=initial_robot_position,
             initial_object_pose=initial_object_pose,
         )
 
         # visualize the goal
-        trifinger_simulation.visual_objects.CubeMarker(
+        self._goal_marker = trifinger_simulation.visual_objects.CubeMarker(
             width=task._CUBE_WIDTH,
             position=goal.position,
             orientation=goal.orientation,
             pybullet_client_id=platform.simfinger._pybullet_client_id,
         )
 
+        # snapshot of the initial state for reset()
+        client_id = platform.simfinger._pybullet_client_id
+        # otherwise the order of the contact pairs (and thereby the
+        # simulation) depends on the previous episodes
+        pybullet.setPhysicsEngineParameter(
+            deterministicOverlappingPairs=1, physicsClientId=client_id
+        )
+        self._initial_state_id = pybullet.saveState(
+            physicsClientId=client_id
+        )
+        # start the first episode from the restored snapshot as well, so it
+        # is the same as one started with reset()
+        self._restore_platform_sim(platform, initial_object_pose)
+
         return platform
 
+    def _restore_platform_sim(self, platform, initial_object_pose):
+        """Restore simulation to the state after _get_platform_sim."""
+
+        pybullet.restoreState(
+            self._initial_state_id,
+            physicsClientId=platform.simfinger._pybullet_client_id,
+        )
+        platform.cube.set_state(
+            initial_object_pose.position, initial_object_pose.orientation
+        )
+        self._goal_marker.set_state(self.goal.position, self.goal.orientation)
+
+        # the platform keeps time and camera bookkeeping outside of pybullet,
+        # reset it like TriFingerPlatform.__init__ does
+        platform.simfinger._t = -1
+        platform._next_camera_trigger_t = 0
+        platform._next_camera_observation_ready_t = None
+        platform._action_log = {
+            "initial_robot_position": copy.copy(
+                trifingerpro_limits.robot_position.default
+            ),
+            "initial_object_pose": copy.copy(initial_object_pose),
+            "actions": [],
+        }
+        platform._delayed_camera_observation = (
+            platform._get_current_camera_observation(0)
+        )
+        platform._camera_observation_t = platform._delayed_camera_observation
+
     def _get_platform_real(self):
         """Initialize real robot platform."""
 
@@ -96,47 +319,85 @@ class Robot:
         return platform
 
     def _get_kinematics(self):
-        """Get kinematics object."""
+        """Get kinematics object (shared by all Robot instances)."""
 
-        robot_properties_path = os.path.join(
-            os.path.dirname(trifinger_simulation.__file__), "robot_properties_fingers"
-        )
-        tip_link_names = [
-            "finger_tip_link_0",
-            "finger_tip_link_120",
-            "finger_tip_link_240",
-        ]
-        urdf_file = trifinger_simulation.finger_types_data.get_finger_urdf("trifingerpro")
-        finger_urdf_path = os.path.join(
-            robot_properties_path, "urdf", urdf_file
-        )
-        return Kinematics(
-            finger_urdf_path, tip_link_names
-        )
+        return get_kinematics()
 
     def append_desired_action(self, torque=None, position=None):
-        """Append action to queue."""
-
-        kwargs = {}
-        if position is not None:
-            kwargs["position"] = position
-        if torque is not None:
-            kwargs["torque"] = torque
-        robot_action = self.platform.Action(**kwargs)
+        """Append action to queue.
+
+        Position and torque are copied into the preallocated action, which
+        is then passed on (unset positions are NaN, unset torques zero).
+        """
+
+        if position is None:
+            self._position.fill(np.nan)
+        else:
+            np.copyto(self._position, position)
+        if torque is None:
+            self._torque.fill(0.)
+        else:
+            np.copyto(self._torque, torque)
+        # assign again, attributes of robot_interfaces actions are copies
+        robot_action = self._action
+        robot_action.position = self._position
+        robot_action.torque = self._torque
+
+        start = perf_counter()
         t = self.platform.append_desired_action(robot_action)
+        self.timer.record("append_desired_action", start)
+        self.timer.end_step()
 
-        # avoid simulator running faster than real time
-        if self.simulate:
-            if self.time_of_last_step is not None:
-                sleep(max(0.001 - (time() - self.time_of_last_step), 0.))
-            self.time_of_last_step = time()
+        if self.pacer is not None:
+            self.pacer.wait()
 
+        self.timer.start_step()
         return t
 
+    def get_camera_timestamp(self, t):
+        """Get timestamp of the latest camera observation at time step t."""
+
+        if self.prefetcher is not None:
+            _, _, camera_observation = self.prefetcher.get(t)
+        else:
+            camera_observation = self._get_camera_observation(t)
+        return camera_observation.cameras[0].timestamp
+
+    def _get_camera_observation(self, t):
+        """Get camera observation of time step t, fetched once per step."""
+
+        if self._camera_observation_t != t:
+            start = perf_counter()
+            self._camera_observation = self.platform.get_camera_observation(t)
+            self._camera_observation_t = t
+            self.timer.record("get_camera_observation", start)
+        return self._camera_observation
+
     def get_observation(self, t):
-        """Get robot and object observation at time step t."""
+        """Get robot and object observation at time step t.
+
+        With prefetching, this returns the latest prefetched observations,
+        which may be from an earlier step if t was not fetched yet.  With
+        filter_object_pose, the object pose is predicted for time step t.
+        """
+
+        if self.prefetcher is not None:
+            start = perf_counter()
+            _, robot_observation, camera_observation = self.prefetcher.get(t)
+            self.timer.record("get_prefetched_observation", start)
+        else:
+            start = perf_counter()
+            robot_observation = self.platform.get_robot_observation(t)
+            self.timer.record("get_robot_observation", start)
+            camera_observation = self._get_camera_observation(t)
 
-        robot_observation = self.platform.get_robot_observation(t)
-        camera_observation = self.platform.get_camera_observation(t)
         object_observation = camera_observation.object_pose
+        if self.pose_filter is not None:
+            start = perf_counter()
+            object_observation = self.pose_filter.filter(
+                camera_observation.cameras[0].timestamp,
+                object_observation,
+                self.platform.get_timestamp_ms(t) / 1000.,
+            )
+            self.timer.record("pose_filter", start)
         return robot_observation, object_observation
\ No newline at end of file
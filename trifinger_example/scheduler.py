@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class ControlScheduler:
+    """Runs a policy at camera rate (or a fixed rate) within the robot loop.
+
+    The object pose only changes when a new camera frame arrives (~10 Hz),
+    so recomputing the plan in every 1 kHz robot step is mostly wasted.  The
+    scheduler calls the policy only when a new camera frame is available (or,
+    if policy_rate is set, at that rate) and holds or linearly interpolates
+    the joint position targets in between.
+    """
+
+    def __init__(self, policy, policy_rate=None, interpolate=False,
+                 control_rate=1000, camera_rate=10):
+        """
+        Args:
+            policy: Function policy(robot, t) returning a tuple of joint
+                target position and torque (either can be None).
+            policy_rate: Rate (in Hz) at which to call the policy.  If None,
+                the policy is called whenever a new camera frame arrives.
+            interpolate: Interpolate position targets from the previous to
+                the new plan over one policy period instead of holding them.
+            control_rate: Rate (in Hz) of the robot control loop.
+            camera_rate: Rate (in Hz) of the cameras.
+        """
+        self.policy = policy
+        self.policy_rate = policy_rate
+        self.interpolate = interpolate
+
+        if policy_rate is None:
+            self.plan_interval = max(int(round(control_rate / camera_rate)), 1)
+        else:
+            self.plan_interval = max(int(round(control_rate / policy_rate)), 1)
+
+        self.num_plans = 0
+        self.reset()
+
+    def reset(self):
+        """Discard the current plan (e.g. at the start of an episode)."""
+
+        self._plan_t = None
+        self._camera_timestamp = None
+        self._position = None
+        self._torque = None
+        self._start_position = None
+        self._last_position = None
+
+    def get_action(self, robot, t):
+        """Determine the robot actions, replanning only when needed."""
+
+        if self.policy_rate is None:
+            camera_timestamp = robot.get_camera_timestamp(t)
+            plan_due = (
+                self._plan_t is None
+                or camera_timestamp != self._camera_timestamp
+            )
+            self._camera_timestamp = camera_timestamp
+        else:
+            plan_due = (
+                self._plan_t is None
+                or t - self._plan_t >= self.plan_interval
+            )
+
+        if plan_due:
+            position, self._torque = self.policy(robot, t)
+            self.num_plans += 1
+            self._plan_t = t
+
+            if position is None:
+                self._position = None
+            else:
+                self._position = np.asarray(position, dtype=float)
+            # interpolate starting from the last commanded position
+            self._start_position = self._last_position
+
+        position = self._position
+        if (
+            self.interpolate
+            and position is not None
+            and self._start_position is not None
+        ):
+            alpha = min((t - self._plan_t + 1) / self.plan_interval, 1.)
+            position = (
+                self._start_position
+                + alpha * (self._position - self._start_position)
+            )
+        self._last_position = position
+
+        return position, self._torque
@@ -0,0 +1,73 @@
+import argparse
+import json
+
+from trifinger_example.benchmarks import step_allocations, step_jitter
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Measure allocations and timing jitter of the control
+        step in simulation (headless, unpaced)."""
+    )
+    parser.add_argument(
+        "--allocation_steps",
+        type=int,
+        default=1000,
+        help="Number of steps traced for the allocations."
+    )
+    parser.add_argument(
+        "--jitter_steps",
+        type=int,
+        default=5000,
+        help="Number of steps timed for the jitter."
+    )
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        default=1,
+        help="Difficulty level of the goal."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Save the results to this JSON file."
+    )
+    args = parser.parse_args()
+
+    allocations = step_allocations(
+        args.allocation_steps, difficulty=args.difficulty
+    )
+    jitter = step_jitter(args.jitter_steps, difficulty=args.difficulty)
+
+    print("allocated bytes per step     mean       p99       max")
+    for part in ("controller", "platform"):
+        for kind in ("peak", "retained"):
+            stats = allocations["{}_{}".format(part, kind)]
+            print("{:<24}{:>10.0f}{:>10.0f}{:>10.0f}".format(
+                "{} ({})".format(part, kind),
+                stats["mean"],
+                stats["percentiles"]["99"],
+                stats["max"],
+            ))
+    print("step [us]: mean {:.1f}, std {:.1f}, p50 {:.1f}, p99 {:.1f}, "
+          "max {:.1f}".format(
+              1e6 * jitter["mean"],
+              1e6 * jitter["std"],
+              1e6 * jitter["percentiles"]["50"],
+              1e6 * jitter["percentiles"]["99"],
+              1e6 * jitter["max"],
+          ))
+    print("garbage collections per generation: {}".format(
+        jitter["gc_collections"]
+    ))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"allocations": allocations, "jitter": jitter}, f, indent=4
+            )
+
+
+if __name__ == "__main__":
+    main()
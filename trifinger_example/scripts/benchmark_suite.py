@@ -0,0 +1,95 @@
+import argparse
+import json
+import sys
+
+from trifinger_example.benchmarks import BASELINE_FILE, SUITE, compare, run_suite
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Time the hot paths of the package (CPU only) and
+        compare them against a stored baseline.  Exits with status 1 if a
+        regression is found."""
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(SUITE),
+        default=None,
+        help="Run only these benchmarks."
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.,
+        help="Factor for the number of calls of each benchmark."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=BASELINE_FILE,
+        help="""JSON file with baseline results to compare against (an empty
+        string to not compare).  Default: the baseline of the package, which
+        is only meaningful on a machine like the one it was recorded on, so
+        record your own with --save_baseline first."""
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="""Relative increase of the median over the baseline that
+        counts as regression.  Default: %(default)s."""
+    )
+    parser.add_argument(
+        "--save_baseline",
+        type=str,
+        default=None,
+        help="Save the results as new baseline to this JSON file."
+    )
+    args = parser.parse_args()
+
+    results = run_suite(args.only, scale=args.scale)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    print("{:<24}{:>8}{:>12}{:>12}{:>12}".format(
+        "benchmark [us]", "calls", "median", "p90", "baseline"
+    ))
+    for name, stats in results["benchmarks"].items():
+        reference = ""
+        if baseline is not None and name in baseline["benchmarks"]:
+            reference = "{:.1f}".format(
+                1e6 * baseline["benchmarks"][name]["median"]
+            )
+        print("{:<24}{:>8}{:>12.1f}{:>12.1f}{:>12}".format(
+            name,
+            stats["calls"],
+            1e6 * stats["median"],
+            1e6 * stats["p90"],
+            reference,
+        ))
+    for name in results["skipped"]:
+        print("{:<24}skipped (missing dependency)".format(name))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, threshold=args.threshold)
+        for regression in regressions:
+            print("REGRESSION {}: {:.1f} us vs. {:.1f} us ({:.2f}x)".format(
+                regression["name"],
+                1e6 * regression["median"],
+                1e6 * regression["baseline_median"],
+                regression["ratio"],
+            ))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import getpass
+import os
+import sys
+
+from trifinger_example.download import (
+    BASE_URL,
+    JOB_FILES,
+    DownloadError,
+    Downloader,
+    HTTPClient,
+    download_jobs,
+)
+
+
+# environment variable from which the password is read if set (e.g. when
+# called from a script that already asked for it)
+PASSWORD_VARIABLE = "ROBOT_CLUSTER_PASSWORD"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Download the data of one or more jobs from the robot
+        cluster.  Interrupted downloads are resumed when run again."""
+    )
+    parser.add_argument(
+        "job_ids",
+        nargs="+",
+        help="IDs of the jobs."
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=".",
+        help="Directory in which a sub-directory per job is created."
+    )
+    parser.add_argument(
+        "--username",
+        type=str,
+        default=None,
+        help="User name on the cluster (asked for if not given)."
+    )
+    parser.add_argument(
+        "--base_url",
+        type=str,
+        default=BASE_URL,
+        help="""URL of the data directory, {username} is replaced.  Default:
+        %(default)s."""
+    )
+    parser.add_argument(
+        "--files",
+        nargs="+",
+        default=JOB_FILES,
+        help="Files to download per job.  Default: all."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of parallel transfers."
+    )
+    args = parser.parse_args()
+
+    username = args.username or input("Username: ")
+    password = os.environ.get(PASSWORD_VARIABLE) or getpass.getpass()
+
+    client = HTTPClient(
+        args.base_url.format(username=username), username, password
+    )
+    downloader = Downloader(client, workers=args.workers)
+    try:
+        status = download_jobs(
+            downloader, args.job_ids, args.output_dir, args.files
+        )
+    except DownloadError as e:
+        print("Download failed: {}".format(e))
+        sys.exit(1)
+
+    for path, result in sorted(status.items()):
+        print("{:<12}{}".format(result, path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+
+from trifinger_example.evaluation import DEFAULT_CACHE_DIR, aggregate, evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Evaluate the controller in simulation on a fixed set
+        of seeded goals.  Results are cached per controller code version."""
+    )
+    parser.add_argument(
+        "num_goals",
+        type=int,
+        help="Number of goals (seeds first_seed, first_seed + 1, ...)."
+    )
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        default=1,
+        help="Difficulty level of the goals."
+    )
+    parser.add_argument(
+        "--first_seed",
+        type=int,
+        default=0,
+        help="Seed of the first goal."
+    )
+    parser.add_argument(
+        "--episode_length",
+        type=int,
+        default=10000,
+        help="Episode length in ms (robot steps)."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory of the result cache.  Default: %(default)s."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Save the per-episode results and the summary to a JSON file."
+    )
+    args = parser.parse_args()
+
+    seeds = range(args.first_seed, args.first_seed + args.num_goals)
+    results, num_run = evaluate(
+        seeds,
+        difficulty=args.difficulty,
+        episode_length=args.episode_length,
+        processes=args.processes,
+        cache_dir=args.cache_dir,
+    )
+    summary = aggregate(results)
+
+    print("ran {} of {} episodes, {} cached".format(
+        num_run, len(results), len(results) - num_run
+    ))
+    for key, value in summary.items():
+        print("{:<20} {}".format(key, value))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "episodes": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+from time import time
+
+from trifinger_example.log_store import export_log
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Convert robot and camera log of a job to memory-mapped
+        NumPy columns (see trifinger_example.log_store)."""
+    )
+    parser.add_argument(
+        "robot_log",
+        type=str,
+        help="Path to the robot log file (robot_data.dat)."
+    )
+    parser.add_argument(
+        "camera_log",
+        type=str,
+        help="Path to the camera log file (camera_data.dat)."
+    )
+    parser.add_argument(
+        "output_dir",
+        type=str,
+        help="Directory to which the columns are written."
+    )
+    args = parser.parse_args()
+
+    start_time = time()
+    store = export_log(args.robot_log, args.camera_log, args.output_dir)
+    print("Exported time indices {}-{} and {} camera frames in {:.1f} s".format(
+        store.first_timeindex,
+        store.last_timeindex,
+        store.index["num_camera_frames"],
+        time() - start_time,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from trifinger_example.log_store import LogStore
+from trifinger_example.replay import RecordedData, ReplayRobot, replay
+from trifinger_example.scheduler import ControlScheduler
+from trifinger_example.scripts.run_robot import get_action
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Run the controller on recorded observations of a job
+        (no robot or simulator needed) and report its throughput."""
+    )
+    parser.add_argument(
+        "data",
+        type=str,
+        help="""Directory written by export_log or robot log file
+        (robot_data.dat, requires --camera_log)."""
+    )
+    parser.add_argument(
+        "--camera_log",
+        type=str,
+        default=None,
+        help="Camera log file (camera_data.dat) if data is a robot log."
+    )
+    parser.add_argument(
+        "--goal",
+        type=str,
+        default=None,
+        help="Goal file (goals.json) of the job.  Default: cube at center."
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=None,
+        help="Number of steps to replay (default: all)."
+    )
+    parser.add_argument(
+        "--unfiltered",
+        action="store_true",
+        help="Use the unfiltered object pose."
+    )
+    parser.add_argument(
+        "--policy_rate",
+        type=float,
+        default=None,
+        help="See run_robot."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Save the action stream to this .npz file."
+    )
+    args = parser.parse_args()
+
+    filtered = not args.unfiltered
+    if os.path.isdir(args.data):
+        data = RecordedData(LogStore(args.data), filtered=filtered)
+    elif args.camera_log is not None:
+        data = RecordedData.from_log(
+            args.data, args.camera_log, filtered=filtered
+        )
+    else:
+        parser.error("--camera_log is required if data is a robot log.")
+
+    if args.goal is not None:
+        with open(args.goal, "r") as f:
+            goal_position = json.load(f)["goal"][0]["position"]
+    else:
+        goal_position = [0., 0., 0.0325]
+
+    robot = ReplayRobot(data, goal_position, episode_length=args.steps)
+    if args.policy_rate is None:
+        scheduler = None
+    else:
+        scheduler = ControlScheduler(
+            get_action, policy_rate=args.policy_rate or None
+        )
+
+    steps_per_second = replay(robot, scheduler)
+    print(robot.timer.format_summary())
+    print("{} steps, {:.0f} steps/s".format(
+        robot.episode_length, steps_per_second
+    ))
+
+    if args.output:
+        np.savez(args.output, position=robot.positions, torque=robot.torques)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+
+from trifinger_example.episode_runner import run_episodes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run seeded episodes in simulation on a process pool."
+    )
+    parser.add_argument(
+        "num_episodes",
+        type=int,
+        help="Number of episodes to run."
+    )
+    parser.add_argument(
+        "--first_seed",
+        type=int,
+        default=0,
+        help="Seed of the first episode, further episodes count up from it."
+    )
+    parser.add_argument(
+        "--episode_length",
+        type=int,
+        default=10000,
+        help="Episode length in ms (robot steps)."
+    )
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        default=1,
+        help="Difficulty level of the goals."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Save the per-episode results to this JSON file."
+    )
+    args = parser.parse_args()
+
+    results = run_episodes(
+        range(args.first_seed, args.first_seed + args.num_episodes),
+        episode_length=args.episode_length,
+        difficulty=args.difficulty,
+        processes=args.processes,
+    )
+
+    for result in results:
+        print("seed {}: position error {:.4f} m ({:.1f} s)".format(
+            result["seed"], result["position_error"], result["wall_time"]
+        ))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import argparse
 from copy import deepcopy
+from time import perf_counter
+
+# the imports below are part of the startup report
+import_start_time = perf_counter()
 
 import numpy as np
 
 import trifinger_simulation
 import trifinger_simulation.tasks.move_cube as task
+from trifinger_example.diagnostics import DiagnosticLog
+from trifinger_example.recorder import EpisodeRecorder
 from trifinger_example.robot import Robot
+from trifinger_example.scheduler import ControlScheduler
 import trifinger_example.utils as utils
 
+import_duration = perf_counter() - import_start_time
+
 
 # example marker (only used in when running in simulation)
 example_marker = None
@@ -23,6 +32,38 @@ arm1 = None
 arm2 = None
 move = None
 
+# tunable constants of get_action (see set_parameters)
+DEFAULT_PARAMETERS = {
+    # distance (in m) of the first tip to its target at which the cube is
+    # moved towards the goal
+    "grasp_threshold": 0.02,
+    # gain of the goal offset that is added to the tip targets
+    "goal_gain": 0.3,
+    # distance (in m) of the tip targets from the cube center
+    "tip_offset": 0.5*task._CUBE_WIDTH,
+}
+parameters = dict(DEFAULT_PARAMETERS)
+
+# preallocated buffers of get_action, so the control step does not allocate
+# arrays of its own
+_target = np.empty((3, 3))
+_diff = np.empty((3, 3))
+_distance = np.empty(3)
+_tip_error = np.empty(3)
+_goal_offset = np.empty(3)
+
+# controller state recorded per step (name -> shape, dtype), see
+# EpisodeRecorder
+CONTROLLER_COLUMNS = {
+    "tip_positions": ((3, 3), np.float64),
+    "object_position": ((3,), np.float64),
+    "target": ((3, 3), np.float64),
+    "joint_target": ((9,), np.float64),
+    "ik_error": ((3, 3), np.float64),
+    "torque": ((9,), np.float64),
+    "move": ((), np.int8),
+}
+
 
 
 def get_action(robot, t):
@@ -31,14 +72,20 @@ def get_action(robot, t):
     # get observations
     robot_observation, object_observation = robot.get_observation(t)
     goal = robot.goal.position
+    # the computation of the action, without waiting for the observation
+    compute_start = perf_counter()
 
     # forward kinematics
-    tip_positions = robot.kinematics.forward_kinematics(robot_observation.position)
+    start = perf_counter()
+    if robot.impedance is not None:
+        # also computes the Jacobians for the torques
+        tip_positions, _ = robot.impedance.update(robot_observation.position)
+    else:
+        tip_positions = robot.kinematics.forward_kinematics(robot_observation.position)
+    robot.timer.record("forward_kinematics", start)
 
     # transform from object to world space
     # x_global_lst = [utils.to_world_space(x_local, object_observation) for x_local in x_local_lst]
-    x_global_lst = [object_observation.position + np.asarray([0, 0., 0.5*task._CUBE_WIDTH + 0.01]),
-                    np.asarray([0.18, 0.18, 0.08])]
 
     # update position of example marker based on transformed points
     if goal_marker is not None:
@@ -56,37 +103,137 @@ def get_action(robot, t):
     # do inverse kinematics
     global move
     object_pos  = object_observation.position
-    diff = object_pos - tip_positions
+    diff = np.subtract(object_pos, tip_positions, out=_diff)
 
-    target = tip_positions.copy()
-    target[0] = object_observation.position - (diff[0]/np.linalg.norm(diff[0])*0.5*task._CUBE_WIDTH)
-    target[1] = object_observation.position - (diff[1]/np.linalg.norm(diff[1])*0.5*task._CUBE_WIDTH)
-    target[2] = object_observation.position - (diff[2]/np.linalg.norm(diff[2])*0.5*task._CUBE_WIDTH)
+    # target = object_pos - diff / |diff| * tip_offset, per finger
+    distance = np.einsum("ij,ij->i", diff, diff, out=_distance)
+    np.sqrt(distance, out=distance)
+    target = np.divide(diff, distance[:, None], out=_target)
+    target *= -parameters["tip_offset"]
+    target += object_pos
 
-    if(np.linalg.norm(tip_positions[0] - target[0])<0.02):
+    tip_error = np.subtract(tip_positions[0], target[0], out=_tip_error)
+    if(np.sqrt(np.dot(tip_error, tip_error))<parameters["grasp_threshold"]):
         move = 1
 
     # if(np.linalg.norm(tip_positions[0] - x_global_lst[0])>0.02):
     #     move = None
     if move is not None:
-        target[0] = target[0] + 0.3*(goal-object_pos)
-        target[1] = target[1] + 0.3*(goal-object_pos)
-        target[2] = target[2] + 0.3*(goal-object_pos)
-        print(target[0])
+        goal_offset = np.subtract(goal, object_pos, out=_goal_offset)
+        goal_offset *= parameters["goal_gain"]
+        target += goal_offset
+        if robot.diagnostics is not None:
+            robot.diagnostics.log("target", t, position=target[0])
     if example_marker is not None:
          example_marker.set_state(target)
 
 
-    target_position, _ = robot.kinematics.inverse_kinematics(
-        tip_target_positions=target,
-        joint_angles_guess=robot_observation.position,
-        max_iterations = 100
-    )
+    if robot.impedance is not None:
+        # torque mode: no iterations, constant cost per step
+        start = perf_counter()
+        torque = robot.impedance.compute_torque(
+            target, robot_observation.position, robot_observation.velocity
+        )
+        robot.timer.record("impedance", start)
+        target_position = None
+        ik_errors = np.nan
+    else:
+        start = perf_counter()
+        target_position, ik_errors = robot.ik.inverse_kinematics(
+            tip_target_positions=target,
+            joint_angles_guess=robot_observation.position,
+        )
+        robot.timer.record("inverse_kinematics", start)
+        torque = None
+
+    duration = robot.timer.record_compute(compute_start)
+    if robot.diagnostics is not None and duration > robot.timer.control_period:
+        robot.diagnostics.log("overrun", t, duration=duration)
+
+    recorder = robot.recorder
+    if recorder is not None:
+        recorder.start_step(t)
+        recorder.record("tip_positions", tip_positions)
+        recorder.record("object_position", object_pos)
+        recorder.record("target", target)
+        recorder.record(
+            "joint_target",
+            np.nan if target_position is None else target_position,
+        )
+        recorder.record("ik_error", ik_errors)
+        recorder.record("torque", 0. if torque is None else torque)
+        recorder.record("move", move is not None)
+        recorder.end_step()
 
 
 
     # return target position and torque, can also be combined
-    return target_position.tolist(), None
+    return target_position, torque
+
+
+def set_parameters(**kwargs):
+    """Set tunable constants of get_action, the others get their default.
+
+    See DEFAULT_PARAMETERS for the names.
+    """
+
+    unknown = set(kwargs) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(
+            "Unknown parameters: {}".format(", ".join(sorted(unknown)))
+        )
+    parameters.clear()
+    parameters.update(DEFAULT_PARAMETERS)
+    parameters.update(kwargs)
+
+
+def run_episode(robot, scheduler=None, step_callback=None, policy=None):
+    """Run the control loop until the end of the episode.
+
+    If a ControlScheduler is given, actions are determined through it,
+    otherwise policy(robot, t) (default: get_action) is called in every
+    step.  If given, step_callback(robot, t) is called after each step.
+    """
+
+    global move
+    move = None
+    robot.ik.reset()
+    if robot.pose_filter is not None:
+        robot.pose_filter.reset()
+    if scheduler is not None:
+        scheduler.reset()
+        action_fn = scheduler.get_action
+    elif policy is not None:
+        action_fn = policy
+    else:
+        action_fn = get_action
+
+    t = 0
+    if robot.pacer is not None:
+        robot.pacer.reset()
+    robot.timer.start_step()
+    while t < robot.episode_length:
+        # get action
+        target_position, torque = action_fn(robot, t)
+        # send action to robot
+        t = robot.append_desired_action(
+            position=target_position,
+            torque=torque
+        )
+        if step_callback is not None:
+            step_callback(robot, t)
+    return t
+
+
+def positive_float(value):
+    """argparse type of floats > 0."""
+
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(
+            "has to be positive, got {}".format(value)
+        )
+    return number
 
 
 def main():
@@ -102,17 +249,142 @@ def main():
         default=10000,
         help="Episode length in ms (robot steps)."
     )
+    parser.add_argument(
+        "--difficulty",
+        type=int,
+        default=1,
+        help="Difficulty level of the goal."
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run the simulation without visualization."
+    )
+    parser.add_argument(
+        "--unpaced",
+        action="store_true",
+        help="Run the simulation as fast as possible instead of real time."
+    )
+    parser.add_argument(
+        "--real_time_factor",
+        type=positive_float,
+        default=1.,
+        help="Speed of the simulation relative to real time."
+    )
+    parser.add_argument(
+        "--control_mode",
+        choices=["position", "torque"],
+        default="position",
+        help="""Send joint positions from inverse kinematics or joint torques
+        from a tip impedance controller with gravity compensation (constant
+        cost per step)."""
+    )
+    parser.add_argument(
+        "--filter_object_pose",
+        action="store_true",
+        help="""Use the object pose predicted for the current step from the
+        camera poses instead of the latest camera pose."""
+    )
+    parser.add_argument(
+        "--policy_rate",
+        type=float,
+        default=None,
+        help="""Recompute the plan at this rate (in Hz) instead of in every
+        robot step.  Use 0 to recompute it whenever a new camera frame
+        arrives."""
+    )
+    parser.add_argument(
+        "--interpolate",
+        action="store_true",
+        help="""Interpolate joint targets between plans instead of holding
+        them (only used with --policy_rate)."""
+    )
+    parser.add_argument(
+        "--ik_time_budget",
+        type=positive_float,
+        default=None,
+        help="""Stop the inverse kinematics iterations of a step after this
+        time (in s), e.g. 0.0005.  By default only the number of iterations
+        is limited, which keeps the results independent of the load of the
+        machine."""
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="""Fetch observations in a background thread (only on the real
+        robot)."""
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        help="""Record the controller state of every step to this directory.
+        On the real robot it is always recorded (default:
+        /output/controller_log)."""
+    )
+    parser.add_argument(
+        "--diagnostics",
+        type=str,
+        default=None,
+        help="""Write rate-limited diagnostic records to this directory.  On
+        the real robot they are always written (default:
+        /output/diagnostics)."""
+    )
+    parser.add_argument(
+        "--binary_diagnostics",
+        action="store_true",
+        help="Write the diagnostic records as binary files instead of JSON lines."
+    )
+    parser.add_argument(
+        "--startup_report",
+        action="store_true",
+        help="Print how long the imports and the initialization took."
+    )
     args = parser.parse_args()
+    if args.control_mode == "torque" and args.policy_rate is not None:
+        # held torques would not be damped between the plans
+        parser.error("--policy_rate is only supported in position mode.")
 
     # initialize robot platform
     robot = Robot(
         simulate=args.simulate,
-        episode_length=args.episode_length
+        episode_length=args.episode_length,
+        difficulty=args.difficulty,
+        visualization=not args.headless,
+        real_time_factor=None if args.unpaced else args.real_time_factor,
+        ik_time_budget=args.ik_time_budget,
+        prefetch_observations=args.prefetch,
+        control_mode=args.control_mode,
+        filter_object_pose=args.filter_object_pose,
     )
-    t = 0
+
+    robot.startup_timings = dict(
+        imports=import_duration, **robot.startup_timings
+    )
+    if args.startup_report:
+        for phase, duration in robot.startup_timings.items():
+            print("startup {:<12}{:>10.1f} ms".format(phase, 1e3 * duration))
+
+    record_path = args.record
+    if record_path is None and not args.simulate:
+        record_path = "/output/controller_log"
+    if record_path is not None:
+        robot.recorder = EpisodeRecorder(
+            record_path, CONTROLLER_COLUMNS, num_steps=robot.episode_length
+        )
+
+    diagnostics_path = args.diagnostics
+    if diagnostics_path is None and not args.simulate:
+        diagnostics_path = "/output/diagnostics"
+    if diagnostics_path is not None:
+        robot.diagnostics = DiagnosticLog(
+            diagnostics_path,
+            rate_limits={"target": 10, "overrun": 10},
+            binary=args.binary_diagnostics,
+        )
 
     # can use markers to visualize positions (when running in simulation)
-    if args.simulate:
+    if args.simulate and not args.headless:
         global example_marker # please accept my apologies
         example_marker = trifinger_simulation.visual_objects.Marker(
                             number_of_goals=3,
@@ -126,15 +398,35 @@ def main():
                             initial_position=[0.18, 0.18, 0.08],
                         )
 
-    # control loop
-    while t < args.episode_length:
-        # get action
-        target_position, torque = get_action(robot, t)
-        # send action to robot
-        t = robot.append_desired_action(
-            position=target_position,
-            torque=torque
+    if args.policy_rate is None:
+        scheduler = None
+    else:
+        scheduler = ControlScheduler(
+            get_action,
+            policy_rate=args.policy_rate or None,
+            interpolate=args.interpolate,
         )
 
+    # control loop
+    run_episode(robot, scheduler)
+    if robot.recorder is not None:
+        robot.recorder.close()
+    if robot.diagnostics is not None:
+        robot.diagnostics.close()
+
+    # timings are saved next to goals.json on the real robot
+    if args.simulate:
+        print(robot.timer.format_summary())
+        print("late steps: {} of {}".format(
+            robot.pacer.late_steps, robot.pacer.steps
+        ))
+    else:
+        robot.save_timings()
+        if robot.prefetcher is not None:
+            robot.prefetcher.stop()
+            print("stale prefetched observations: {}".format(
+                robot.prefetcher.stale_reads
+            ))
+
 if __name__ == "__main__":
     main()
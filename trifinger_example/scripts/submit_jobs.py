@@ -0,0 +1,152 @@
+import argparse
+import getpass
+import os
+import shlex
+
+from trifinger_example.download import BASE_URL
+from trifinger_example.pipeline import (
+    ClusterBackend,
+    LocalBackend,
+    Pipeline,
+    VideoRenderer,
+)
+
+
+PASSWORD_VARIABLE = "ROBOT_CLUSTER_PASSWORD"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Submit jobs to the robot cluster, download their data
+        and render videos.  Downloading and rendering of finished jobs
+        overlap with the next jobs on the cluster.  The progress is stored
+        in the output directory, so an interrupted run continues when it is
+        started again with the same arguments."""
+    )
+    parser.add_argument(
+        "output_dir",
+        type=str,
+        help="Directory to which the data is downloaded."
+    )
+    parser.add_argument(
+        "num_submissions",
+        type=int,
+        help="Total number of jobs to submit."
+    )
+    parser.add_argument(
+        "--image",
+        type=str,
+        default=None,
+        help="""Path to video_creation_image.sif for rendering the videos.
+        If not set, the data is only downloaded."""
+    )
+    parser.add_argument(
+        "--viewer",
+        type=str,
+        default=None,
+        help="""Path to scripts/trifinger_platform_log_viewer_V2.py of this
+        repository.  Required with --image."""
+    )
+    parser.add_argument(
+        "--camera",
+        type=str,
+        default="camera60",
+        help="Camera of the videos.  Default: %(default)s."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of jobs downloaded/rendered in parallel."
+    )
+    parser.add_argument(
+        "--max_running",
+        type=int,
+        default=1,
+        help="""Max. number of jobs on the cluster at once.  The cluster runs
+        the jobs of a user one after another, so only increase this for
+        --local.  Default: %(default)s."""
+    )
+    parser.add_argument(
+        "--username",
+        type=str,
+        default=None,
+        help="User name on the cluster (asked for if not given)."
+    )
+    parser.add_argument(
+        "--base_url",
+        type=str,
+        default=BASE_URL,
+        help="""URL of the data directory, {username} is replaced.  Default:
+        %(default)s."""
+    )
+    parser.add_argument(
+        "--local",
+        type=str,
+        metavar="COMMAND",
+        default=None,
+        help="""Run the jobs on a fake local cluster instead: COMMAND is run
+        with the job directory as last argument.  For testing."""
+    )
+    parser.add_argument(
+        "--local_data_dir",
+        type=str,
+        default=None,
+        help="""Data directory of the fake cluster (default:
+        <output_dir>/local_cluster)."""
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=60.,
+        help="""Min. time (in s) between requests to the cluster.  Must not
+        be below 60 for the real cluster."""
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.output_dir):
+        parser.error("{} is not a directory".format(args.output_dir))
+    if args.image is not None and args.viewer is None:
+        parser.error("--viewer is required with --image")
+
+    if args.local is not None:
+        data_dir = args.local_data_dir or os.path.join(
+            args.output_dir, "local_cluster"
+        )
+        backend = LocalBackend(data_dir, shlex.split(args.local))
+    else:
+        if args.poll_interval < 60.:
+            parser.error(
+                "Do not poll the cluster more often than once per minute."
+            )
+        username = args.username or input("Username: ")
+        password = os.environ.get(PASSWORD_VARIABLE) or getpass.getpass()
+        backend = ClusterBackend(username, password, base_url=args.base_url)
+
+    render = None
+    if args.image is not None:
+        render = VideoRenderer(
+            args.image,
+            args.viewer,
+            camera=args.camera,
+            workers=max(os.cpu_count() // args.workers, 1),
+        )
+
+    pipeline = Pipeline(
+        backend,
+        args.output_dir,
+        args.num_submissions,
+        render=render,
+        workers=args.workers,
+        poll_interval=args.poll_interval,
+        max_running=args.max_running,
+    )
+    states = pipeline.run()
+
+    print()
+    for job_id, state in sorted(states.items(), key=lambda item: int(item[0])):
+        print("{:<10}{}".format(job_id, state))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+
+from trifinger_example.sweep import load_spec, pareto_front, run_sweep, summarize
+
+
+def format_parameters(parameters):
+    return ", ".join(
+        "{}={:g}".format(name, value)
+        for name, value in sorted(parameters.items())
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Sweep the controller constants in simulation (see
+        trifinger_example.sweep for the spec format).  Interrupted sweeps
+        continue where they stopped."""
+    )
+    parser.add_argument(
+        "spec",
+        type=str,
+        help="JSON file with the sweep spec."
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        default=None,
+        help="""JSON lines file to which the episode results are appended
+        (default: <spec>_results.jsonl)."""
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Save the per-configuration summary to a JSON file."
+    )
+    args = parser.parse_args()
+
+    results_path = args.results
+    if results_path is None:
+        results_path = os.path.splitext(args.spec)[0] + "_results.jsonl"
+
+    results, num_run = run_sweep(
+        load_spec(args.spec), results_path, processes=args.processes
+    )
+    print("ran {} of {} episodes (others were stored)".format(
+        num_run, len(results)
+    ))
+
+    summaries = summarize(results)
+    front = pareto_front(summaries)
+    print("{:>8}{:>10}{:>12}  parameters".format(
+        "success", "error", "IK [us]"
+    ))
+    for summary in sorted(
+        summaries, key=lambda summary: -summary["success_rate"]
+    ):
+        print("{:>8.2f}{:>10.4f}{:>12.1f}  {}{}".format(
+            summary["success_rate"],
+            summary["mean_position_error"],
+            1e6 * summary["ik_time_per_step"],
+            format_parameters(summary["parameters"]),
+            "  (pareto)" if summary in front else "",
+        ))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"configurations": summaries, "pareto_front": front},
+                f,
+                indent=4,
+            )
+
+
+if __name__ == "__main__":
+    main()
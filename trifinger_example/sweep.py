@@ -0,0 +1,229 @@
+"""Parameter sweeps over the constants of the controller.
+
+A sweep is described by a JSON spec, for example::
+
+    {
+        "search": "grid",
+        "parameters": {
+            "goal_gain": [0.2, 0.3, 0.4],
+            "grasp_threshold": [0.01, 0.02, 0.03]
+        },
+        "seeds": 20,
+        "difficulty": 1,
+        "episode_length": 5000
+    }
+
+The parameters are those of episode_runner.run_seeded_episode (grasp
+threshold, goal gain and tip offset of get_action and the max. number of IK
+iterations), unspecified ones keep their default.  With "search": "random",
+"num_samples" configurations are drawn (using "random_seed"), each
+parameter given either as a list of choices or as {"low": ..., "high": ...}
+(uniform, integer if both bounds are integers).  Every configuration is run
+on the seeds 0, ..., seeds - 1 (or the given list of seeds).
+
+Results are appended to a JSON lines file as soon as an episode finishes.
+Episodes that are already in the file (for the same controller code, see
+evaluation.controller_hash) are not run again, so an interrupted sweep can
+simply be restarted.
+"""
+import itertools
+import json
+import os
+
+import numpy as np
+
+from .episode_runner import full_parameters, iter_parameter_episodes
+from .evaluation import aggregate, controller_hash
+
+
+def load_spec(path):
+    """Load sweep spec from a JSON file."""
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _seeds(spec):
+    seeds = spec.get("seeds", 10)
+    if isinstance(seeds, int):
+        return list(range(seeds))
+    return list(seeds)
+
+
+def configurations(spec):
+    """Get the list of parameter configurations of a sweep spec."""
+
+    parameters = spec["parameters"]
+    # fail early on typos instead of in the workers
+    full_parameters(parameters)
+
+    search = spec.get("search", "grid")
+    if search == "grid":
+        names = sorted(parameters)
+        return [
+            dict(zip(names, values))
+            for values in itertools.product(
+                *(parameters[name] for name in names)
+            )
+        ]
+    elif search == "random":
+        rng = np.random.RandomState(spec.get("random_seed", 0))
+        configs = []
+        for _ in range(spec["num_samples"]):
+            config = {}
+            for name in sorted(parameters):
+                values = parameters[name]
+                if isinstance(values, dict):
+                    low, high = values["low"], values["high"]
+                    if isinstance(low, int) and isinstance(high, int):
+                        config[name] = int(rng.randint(low, high + 1))
+                    else:
+                        config[name] = float(rng.uniform(low, high))
+                else:
+                    config[name] = values[rng.randint(len(values))]
+            configs.append(config)
+        return configs
+    else:
+        raise ValueError("Unknown search '{}'.".format(search))
+
+
+def _key(parameters, seed, difficulty, episode_length):
+    return (
+        json.dumps(parameters, sort_keys=True),
+        seed,
+        difficulty,
+        episode_length,
+    )
+
+
+class SweepStore:
+    """Results of a sweep in a JSON lines file, one episode per line."""
+
+    def __init__(self, path, code_hash):
+        """
+        Args:
+            path: Path of the file (created if it does not exist).
+            code_hash: Hash of the controller code.  Results of other code
+                versions are kept in the file but ignored.
+        """
+        self.path = path
+        self.code_hash = code_hash
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    # skip a line that was cut off by an interrupted run
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue
+                    if result.get("code_hash") == code_hash:
+                        self.results[self._result_key(result)] = result
+
+    @staticmethod
+    def _result_key(result):
+        return _key(
+            result["parameters"],
+            result["seed"],
+            result["difficulty"],
+            result["episode_length"],
+        )
+
+    def get(self, parameters, seed, difficulty, episode_length):
+        """Get stored result or None."""
+
+        return self.results.get(
+            _key(parameters, seed, difficulty, episode_length)
+        )
+
+    def append(self, result):
+        """Add result and write it to the file."""
+
+        result = dict(result, code_hash=self.code_hash)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        self.results[self._result_key(result)] = result
+
+
+def run_sweep(spec, results_path, processes=None):
+    """Run all episodes of a sweep that are not in the results file yet.
+
+    Returns:
+        Tuple of the results of all episodes of the sweep and the number of
+        episodes that were run.
+    """
+
+    difficulty = spec.get("difficulty", 1)
+    episode_length = spec.get("episode_length", 10000)
+    store = SweepStore(results_path, controller_hash())
+
+    keys = []
+    missing = []
+    for config in configurations(spec):
+        parameters = full_parameters(config)
+        for seed in _seeds(spec):
+            keys.append((parameters, seed))
+            if store.get(parameters, seed, difficulty, episode_length) is None:
+                missing.append((seed, parameters))
+
+    for result in iter_parameter_episodes(
+        missing, episode_length, difficulty, processes
+    ):
+        store.append(dict(result, episode_length=episode_length))
+
+    results = [
+        store.get(parameters, seed, difficulty, episode_length)
+        for parameters, seed in keys
+    ]
+    return results, len(missing)
+
+
+def summarize(results):
+    """Aggregate the results per configuration.
+
+    Returns:
+        List of dictionaries with the parameters, the aggregate (see
+        evaluation.aggregate) and the mean IK time per step.
+    """
+
+    by_parameters = {}
+    for result in results:
+        key = json.dumps(result["parameters"], sort_keys=True)
+        by_parameters.setdefault(key, []).append(result)
+
+    summaries = []
+    for config_results in by_parameters.values():
+        summary = {"parameters": config_results[0]["parameters"]}
+        summary.update(aggregate(config_results))
+        summary["ik_time_per_step"] = float(np.mean(
+            [result["ik_time_per_step"] for result in config_results]
+        ))
+        summaries.append(summary)
+    return summaries
+
+
+def pareto_front(summaries):
+    """Get the configurations with the best trade-off of success rate and IK
+    time per step.
+
+    A configuration is on the front if no other one has at least the same
+    success rate with at most the same IK time and is better in one of them.
+
+    Returns:
+        The summaries on the front, sorted by IK time.
+    """
+
+    front = []
+    for summary in summaries:
+        dominated = any(
+            other["success_rate"] >= summary["success_rate"]
+            and other["ik_time_per_step"] <= summary["ik_time_per_step"]
+            and (
+                other["success_rate"] > summary["success_rate"]
+                or other["ik_time_per_step"] < summary["ik_time_per_step"]
+            )
+            for other in summaries
+        )
+        if not dominated:
+            front.append(summary)
+    return sorted(front, key=lambda summary: summary["ik_time_per_step"])
@@ -0,0 +1,171 @@
+import json
+from time import perf_counter
+
+import numpy as np
+
+
+# histogram bin edges in seconds (log-spaced from 1 us to 100 ms)
+HISTOGRAM_BIN_EDGES = np.logspace(-6, -1, 26)
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class StepTimer:
+    """Records per-phase timings of the control loop.
+
+    Durations are written into preallocated arrays (one per phase), so
+    recording only costs a perf_counter() call and an array assignment.  If
+    more than capacity samples are recorded for a phase, the oldest ones are
+    overwritten.
+
+    The "step" phase is the wall-clock period from one action to the next,
+    which includes waiting for the robot (or the pacing of the simulation).
+    Overruns are counted on the "compute" phase, the time the controller
+    needs to determine an action.
+
+    Usage::
+
+        start = perf_counter()
+        ...
+        timer.record("phase_name", start)
+    """
+
+    def __init__(self, capacity, control_period=0.001):
+        """
+        Args:
+            capacity: Number of samples stored per phase.
+            control_period: Duration (in s) of one control step.  Steps in
+                which the controller computation takes longer are counted as
+                overruns.
+        """
+        self.capacity = capacity
+        self.control_period = control_period
+        self.overruns = 0
+
+        self._samples = {}
+        self._counts = {}
+        self._step_start = None
+
+    def record(self, phase, start):
+        """Record duration of a phase that started at time start.
+
+        Args:
+            phase: Name of the phase.
+            start: Start time of the phase as returned by perf_counter().
+
+        Returns:
+            The recorded duration in seconds.
+        """
+
+        duration = perf_counter() - start
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = np.empty(self.capacity)
+            self._counts[phase] = 0
+        count = self._counts[phase]
+        samples[count % self.capacity] = duration
+        self._counts[phase] = count + 1
+        return duration
+
+    def start_step(self):
+        """Mark the start of a control step."""
+
+        self._step_start = perf_counter()
+
+    def end_step(self):
+        """Mark the end of a control step.
+
+        Returns:
+            Duration of the step or None if no step was started.
+        """
+
+        if self._step_start is None:
+            return None
+        return self.record("step", self._step_start)
+
+    def record_compute(self, start):
+        """Record the controller computation of a step and check for overruns.
+
+        Args:
+            start: Start time of the computation as returned by
+                perf_counter().
+
+        Returns:
+            The recorded duration in seconds.
+        """
+
+        duration = self.record("compute", start)
+        if duration > self.control_period:
+            self.overruns += 1
+        return duration
+
+    def get_samples(self, phase):
+        """Get the stored samples of a phase (in s, not in order)."""
+
+        count = min(self._counts.get(phase, 0), self.capacity)
+        if count == 0:
+            return np.empty(0)
+        return self._samples[phase][:count]
+
+    def summary(self):
+        """Get statistics, percentiles and histograms of all phases."""
+
+        phases = {}
+        for phase, count in self._counts.items():
+            samples = self.get_samples(phase)
+            histogram, _ = np.histogram(samples, bins=HISTOGRAM_BIN_EDGES)
+            phases[phase] = {
+                "count": count,
+                "mean": float(np.mean(samples)),
+                "max": float(np.max(samples)),
+                "percentiles": {
+                    str(p): float(v) for p, v in zip(
+                        PERCENTILES, np.percentile(samples, PERCENTILES)
+                    )
+                },
+                "histogram": histogram.tolist(),
+            }
+
+        return {
+            "unit": "s",
+            "control_period": self.control_period,
+            "overruns": self.overruns,
+            "histogram_bin_edges": HISTOGRAM_BIN_EDGES.tolist(),
+            "phases": phases,
+        }
+
+    def save(self, path, extra=None):
+        """Save the summary to a JSON file.
+
+        Args:
+            path: Path of the JSON file.
+            extra: Optional dictionary with additional entries for the file.
+        """
+
+        summary = self.summary()
+        if extra is not None:
+            summary.update(extra)
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=4)
+
+    def format_summary(self):
+        """Get a human-readable table of the phase timings."""
+
+        lines = ["{:<24}{:>10}{:>10}{:>10}{:>10}".format(
+            "phase [us]", "mean", "p50", "p99", "max"
+        )]
+        for phase, stats in self.summary()["phases"].items():
+            if phase == "step":
+                phase = "step (wall period)"
+            lines.append("{:<24}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                phase,
+                1e6 * stats["mean"],
+                1e6 * stats["percentiles"]["50"],
+                1e6 * stats["percentiles"]["99"],
+                1e6 * stats["max"],
+            ))
+        lines.append(
+            "compute overruns of the {:.1f} ms control period: {}".format(
+                1e3 * self.control_period, self.overruns
+            )
+        )
+        return "\n".join(lines)
@@ -1,16 +1,23 @@
-import numpy as np
-import quaternion
+import collections
 
-from scipy.spatial.transform import Rotation
+import numpy as np
 
-import trifinger_simulation.tasks.move_cube as task
+# numpy-quaternion, scipy and trifinger_simulation are imported in the
+# functions that need them, as they are slow to import
 
 
 def to_quat(x):
     """Numpy array to quaternion."""
+    import quaternion  # noqa: F401 (registers np.quaternion)
     return np.quaternion(x[3], x[0], x[1], x[2])
 
 
+# object pose as returned by the log store and the pose filter
+ObjectPose = collections.namedtuple(
+    "ObjectPose", ["position", "orientation", "confidence"]
+)
+
+
 def to_world_space(x_local, pose):
     """Transform from local space of object with given pose to world space."""
 
@@ -21,9 +28,40 @@ def to_world_space(x_local, pose):
     return transl + np.array([q_global.x, q_global.y, q_global.z])
 
 
+def to_world_space_batch(x_local, positions, orientations):
+    """Transform points from local space of objects to world space.
+
+    Vectorized version of to_world_space.  All arguments are broadcast against
+    each other, so e.g. K points for N poses are transformed in one call with
+    x_local of shape (K, 3), positions[:, None] of shape (N, 1, 3) and
+    orientations[:, None] of shape (N, 1, 4), giving a result of shape
+    (N, K, 3).
+
+    Args:
+        x_local: Array of shape (..., 3) with points in local space.
+        positions: Array of shape (..., 3) with object positions.
+        orientations: Array of shape (..., 4) with object orientations as
+            quaternions in (x, y, z, w) order.
+
+    Returns:
+        Array of shape (..., 3) with the points in world space.
+    """
+
+    x_local = np.asarray(x_local, dtype=float)
+    orientations = np.asarray(orientations, dtype=float)
+    q_vec = orientations[..., :3]
+    q_w = orientations[..., 3:]
+    # rotate by q*x*q^-1 without building quaternion objects
+    t = 2. * np.cross(q_vec, x_local)
+    return np.asarray(positions) + x_local + q_w * t + np.cross(q_vec, t)
+
+
 def random_yaw_orientation():
     """Random orientation for cube on floor."""
 
+    from scipy.spatial.transform import Rotation
+    import trifinger_simulation.tasks.move_cube as task
+
     # first "roll the die" to see which face is pointing upward
     up_face = np.random.choice(range(len(task._base_orientations)))
     up_face_rot = task._base_orientations[up_face]
@@ -32,4 +70,24 @@ def random_yaw_orientation():
     yaw_rot = Rotation.from_euler("z", yaw_angle)
     # and combine them
     orientation = yaw_rot * up_face_rot
-    return orientation.as_quat()
\ No newline at end of file
+    return orientation.as_quat()
+
+
+def random_yaw_orientations(k):
+    """K random orientations for cube on floor.
+
+    Vectorized version of random_yaw_orientation.  Returns array of shape
+    (K, 4) with quaternions in (x, y, z, w) order.
+    """
+
+    from scipy.spatial.transform import Rotation
+    import trifinger_simulation.tasks.move_cube as task
+
+    base_orientations = Rotation.from_quat(
+        [rot.as_quat() for rot in task._base_orientations]
+    )
+    up_faces = np.random.randint(len(task._base_orientations), size=k)
+    yaw_angles = np.random.uniform(0, 2 * np.pi, size=k)
+    yaw_rots = Rotation.from_euler("z", yaw_angles[:, None])
+    orientations = yaw_rots * base_orientations[up_faces]
+    return orientations.as_quat()